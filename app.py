@@ -1,38 +1,357 @@
 import os
 import time
+import hashlib
+import resource
+import shutil
+import socket
+import subprocess
 import tempfile
+import threading
 import traceback
 import json as json_mod
+import queue
+import random
+import re
 import sqlite3
 import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, g
+from email.utils import parsedate_to_datetime
+import click
+import contextvars
+from contextlib import contextmanager, nullcontext
+from flask import Flask, Response, render_template, request, jsonify, g, stream_with_context
 from dotenv import load_dotenv
 import anthropic
+import httpx
+import openai
 from openai import OpenAI
 from pydub import AudioSegment
 
-load_dotenv()
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+load_dotenv()
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = "uploads"
 
 DATABASE = "recordings.db"
-active_recording_id = None
 
-MAX_CHARS_PER_CHUNK = 400_000
-RETRY_ATTEMPTS = 3
-RETRY_DELAY = 2
+CLAUDE_MODEL = "claude-sonnet-4-5-20250929"
+
+
+# ─── Text compression ───
+#
+# Transcripts, summaries, emails and cached transcriptions are stored
+# compressed. A stored value is either plain TEXT (short values, and rows
+# written before compression) or a BLOB whose first byte names the codec:
+# b"z" for zlib, or b"s" for zstd followed by a 4-byte id of the dictionary
+# it was compressed with (0 for none). Values are decoded only when a caller
+# actually reads the text; SQL sees them through the decode_text() function.
+#
+# zstd is used when TEXT_CODEC=zstd and the zstandard package is installed.
+# `flask compress-text --train-dict` trains a dictionary on stored
+# transcripts; processes started afterwards compress with it.
+
+TEXT_CODEC = os.getenv("TEXT_CODEC", "zlib")
+TEXT_COMPRESS_MIN_BYTES = 256          # shorter values gain little and stay readable
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+ZSTD_DICT_BYTES = 112 * 1024
+
+zstd_dicts = {}                        # dictionary id -> ZstdCompressionDict
+zstd_dicts_lock = threading.Lock()
+active_zstd_dict = None                # (id, dict) used for new values, looked up once
+
+
+def _zstd_dict(dict_id):
+    with zstd_dicts_lock:
+        zdict = zstd_dicts.get(dict_id)
+    if zdict is None:
+        conn = connect_db()
+        try:
+            row = conn.execute("SELECT data FROM compression_dicts WHERE id = ?", (dict_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise ValueError(f"Unknown compression dictionary {dict_id}")
+        zdict = zstandard.ZstdCompressionDict(row["data"])
+        with zstd_dicts_lock:
+            zstd_dicts[dict_id] = zdict
+    return zdict
+
+
+def _active_zstd_dict():
+    global active_zstd_dict
+    if active_zstd_dict is None:
+        conn = connect_db()
+        try:
+            row = conn.execute("SELECT MAX(id) AS id FROM compression_dicts").fetchone()
+        finally:
+            conn.close()
+        dict_id = row["id"] or 0
+        active_zstd_dict = (dict_id, _zstd_dict(dict_id) if dict_id else None)
+    return active_zstd_dict
+
+
+def text_codec():
+    if TEXT_CODEC == "zstd" and zstandard is None:
+        return "zlib"
+    return TEXT_CODEC
+
+
+def encode_text(text, codec=None):
+    """Value to store for text: compressed bytes, or the text itself if short."""
+    if text is None:
+        return None
+    raw = text.encode()
+    if len(raw) < TEXT_COMPRESS_MIN_BYTES:
+        return text
+    codec = codec or text_codec()
+    if codec == "none":
+        return text
+    if codec == "zstd":
+        dict_id, zdict = _active_zstd_dict()
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zdict)
+        return b"s" + dict_id.to_bytes(4, "big") + compressor.compress(raw)
+    return b"z" + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode_text(value):
+    """Inverse of encode_text; plain TEXT passes through unchanged."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value[:1] == b"z":
+        return zlib.decompress(value[1:]).decode()
+    if value[:1] == b"s":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed text needs the zstandard package")
+        dict_id = int.from_bytes(value[1:5], "big")
+        zdict = _zstd_dict(dict_id) if dict_id else None
+        return zstandard.ZstdDecompressor(dict_data=zdict).decompress(value[5:]).decode()
+    raise ValueError("Unknown text encoding")
+
+
+def register_text_functions(conn):
+    conn.create_function("decode_text", 1, decode_text, deterministic=True)
+
+
+# (table, key column, compressed columns) for compress-text
+COMPRESSED_COLUMNS = (
+    ("recording_bodies", "id", ("transcript", "summary", "email", "notes")),
+    ("passage_texts", "id", ("text",)),
+    ("transcription_cache", "key", ("text",)),
+)
+
+
+def train_zstd_dict(max_recordings=500, sample_chars=4096):
+    """Train a zstd dictionary on recent transcripts, store it and make it active."""
+    global active_zstd_dict
+    samples = []
+    conn = connect_db()
+    try:
+        rows = conn.execute("SELECT transcript FROM recording_bodies ORDER BY id DESC LIMIT ?",
+                            (max_recordings,)).fetchall()
+    finally:
+        conn.close()
+    for row in rows:
+        text = decode_text(row["transcript"]) or ""
+        samples += [text[i:i + sample_chars].encode() for i in range(0, len(text), sample_chars)]
+    zdict = zstandard.train_dictionary(ZSTD_DICT_BYTES, samples)
+    conn = connect_db()
+    try:
+        dict_id = conn.execute("INSERT INTO compression_dicts (data, created_at) VALUES (?, ?)",
+                               (zdict.as_bytes(), _now())).lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    active_zstd_dict = None
+    return dict_id, len(samples)
+
+
+def recompress_table(table, key, columns, codec, batch=100):
+    """Re-encode every value in columns with codec. Returns (values, text bytes, stored before, after)."""
+    values = text_bytes = before = after = 0
+    last = None
+    conn = connect_db()
+    try:
+        while True:
+            # Read inside the write transaction so a concurrent edit can't be overwritten
+            conn.execute("BEGIN IMMEDIATE")
+            where, args = (f"WHERE {key} > ?", (last,)) if last is not None else ("", ())
+            rows = conn.execute(f"SELECT {key}, {', '.join(columns)} FROM {table} {where} ORDER BY {key} LIMIT ?",
+                                (*args, batch)).fetchall()
+            if not rows:
+                conn.rollback()
+                break
+            for row in rows:
+                for col in columns:
+                    if row[col] is None:
+                        continue
+                    text = decode_text(row[col])
+                    stored = encode_text(text, codec)
+                    values += 1
+                    text_bytes += len(text.encode())
+                    before += len(row[col]) if isinstance(row[col], bytes) else len(row[col].encode())
+                    after += len(stored) if isinstance(stored, bytes) else len(stored.encode())
+                    if stored != row[col]:
+                        conn.execute(f"UPDATE {table} SET {col} = ? WHERE {key} = ?", (stored, row[key]))
+            conn.commit()
+            last = rows[-1][key]
+    finally:
+        conn.close()
+    return values, text_bytes, before, after
+
+
+@app.cli.command("compress-text")
+@click.option("--codec", type=click.Choice(["zlib", "zstd", "none"]), default=None,
+              help="Codec to store text with (default: TEXT_CODEC).")
+@click.option("--train-dict", is_flag=True, help="Train a zstd dictionary on stored transcripts first.")
+@click.option("--vacuum", is_flag=True, help="Give freed pages back to the filesystem afterwards.")
+def compress_text_command(codec, train_dict, vacuum):
+    """Re-encode stored text, e.g. to compress rows written before compression existed."""
+    codec = codec or text_codec()
+    if codec == "zstd" and zstandard is None:
+        raise click.ClickException("zstd needs the zstandard package (pip install zstandard)")
+    if train_dict:
+        if codec != "zstd":
+            raise click.ClickException("--train-dict only applies to --codec zstd")
+        try:
+            dict_id, count = train_zstd_dict()
+        except zstandard.ZstdError as e:
+            raise click.ClickException(f"Dictionary training failed (too little text?): {e}")
+        click.echo(f"Trained dictionary {dict_id} on {count} samples")
+    file_before = os.path.getsize(DATABASE)
+    for table, key, columns in COMPRESSED_COLUMNS:
+        values, text_bytes, before, after = recompress_table(table, key, columns, codec)
+        click.echo(f"{table}: {values} values, {text_bytes / 1024:.0f} KB of text, "
+                   f"stored {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+    conn = connect_db()
+    try:
+        conn.execute("UPDATE transcription_cache SET size = length(CAST(text AS BLOB))")
+        conn.commit()
+        if vacuum:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    click.echo(f"{DATABASE}: {file_before / 1024:.0f} KB -> {os.path.getsize(DATABASE) / 1024:.0f} KB"
+               + ("" if vacuum else " (run with --vacuum to shrink the file)"))
+
+
+@app.cli.command("compress-bench")
+@click.option("--samples", default=200, show_default=True, help="Transcripts to test with.")
+def compress_bench_command(samples):
+    """Compare codecs on stored transcripts: size and the cost of reading one back."""
+    conn = connect_db()
+    try:
+        rows = conn.execute("SELECT transcript FROM recording_bodies WHERE transcript IS NOT NULL "
+                            "ORDER BY id DESC LIMIT ?", (samples,)).fetchall()
+    finally:
+        conn.close()
+    texts = [t.encode() for t in (decode_text(r["transcript"]) for r in rows) if t]
+    if not texts:
+        raise click.ClickException("No transcripts to benchmark")
+    # With a dictionary in the mix, train on half and measure everything on the other half
+    train, test = (texts[::2], texts[1::2]) if len(texts) > 1 else (texts, texts)
+
+    codecs = [("zlib-6", lambda b: zlib.compress(b, ZLIB_LEVEL), zlib.decompress)]
+    if zstandard is not None:
+        plain_c, plain_d = zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor()
+        codecs.append((f"zstd-{ZSTD_LEVEL}", plain_c.compress, plain_d.decompress))
+        chunks = [t[i:i + 4096] for t in train for i in range(0, len(t), 4096)]
+        try:
+            zdict = zstandard.train_dictionary(ZSTD_DICT_BYTES, chunks)
+            dict_c = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zdict)
+            dict_d = zstandard.ZstdDecompressor(dict_data=zdict)
+            codecs.append((f"zstd-{ZSTD_LEVEL}+dict", dict_c.compress, dict_d.decompress))
+        except zstandard.ZstdError as e:
+            click.echo(f"Skipping zstd+dict: {e}")
+
+    raw = sum(len(t) for t in test)
+    click.echo(f"{len(test)} transcripts, {raw / 1024:.0f} KB of text, {raw / len(test) / 1024:.1f} KB average")
+    click.echo(f"{'codec':<16}{'stored KB':>10}{'ratio':>8}{'encode ms':>11}{'decode ms':>11}{'p95 ms':>9}")
+    for name, compress, decompress in codecs:
+        t0 = time.perf_counter()
+        blobs = [compress(t) for t in test]
+        encode_ms = (time.perf_counter() - t0) * 1000 / len(test)
+        timings = []
+        for blob in blobs:
+            t0 = time.perf_counter()
+            decompress(blob).decode()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        stored = sum(len(b) for b in blobs)
+        click.echo(f"{name:<16}{stored / 1024:>10.0f}{raw / stored:>8.1f}{encode_ms:>11.2f}"
+                   f"{sum(timings) / len(timings):>11.3f}{timings[int(len(timings) * 0.95)]:>9.3f}")
 
 
 # ─── Database ───
+#
+# The database runs in WAL mode, so readers never wait on a writer (a long
+# summary write doesn't stall the sidebar). Connections are kept per thread
+# and reused: connect_db() hands out an idle one from the calling thread's
+# pool and close() rolls back anything uncommitted and returns it. Nested
+# users on one thread still get separate connections, as before.
+
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", 10))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", 16384))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", 128 * 1024 * 1024))
+SQLITE_IDLE_PER_THREAD = 4
+
+db_local = threading.local()
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection whose close() returns it to its thread's idle pool."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        idle = getattr(db_local, "idle", None)
+        if idle is not None and len(idle) < SQLITE_IDLE_PER_THREAD and self not in idle:
+            idle.append(self)
+        else:
+            super().close()
+
+
+def _open_db():
+    conn = sqlite3.connect(DATABASE, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, factory=PooledConnection)
+    conn.row_factory = sqlite3.Row
+    register_text_functions(conn)
+    conn.execute("PRAGMA synchronous = NORMAL")     # durable in WAL mode, far fewer fsyncs
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES}")
+    return conn
+
+
+def connect_db():
+    if not hasattr(db_local, "idle"):
+        db_local.idle = []
+    if db_local.idle:
+        return db_local.idle.pop()
+    return _open_db()
+
+
+def _reset_db_connections():
+    # Inherited connections belong to the parent; leave them untouched
+    global db_local
+    db_local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset_db_connections)
+
 
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        g.db = connect_db()
     return g.db
 
 
@@ -45,164 +364,2072 @@ def close_db(exc):
 
 def init_db():
     conn = sqlite3.connect(DATABASE)
+    register_text_functions(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Listing scans recordings, so it holds only small metadata; the large
+    # text fields live in recording_bodies and are read for one recording.
     conn.execute("""
         CREATE TABLE IF NOT EXISTS recordings (
             id TEXT PRIMARY KEY,
             name TEXT NOT NULL DEFAULT 'Untitled Recording',
+            created_at TEXT NOT NULL,
+            duration INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recording_bodies (
+            id INTEGER PRIMARY KEY,
+            recording_id TEXT NOT NULL UNIQUE,
             transcript TEXT DEFAULT '',
             summary TEXT DEFAULT '',
             email TEXT DEFAULT '',
-            notes TEXT DEFAULT '',
+            notes TEXT DEFAULT ''
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stream_sessions (
+            id TEXT PRIMARY KEY,
+            recording_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            window_start REAL DEFAULT 0,
+            bytes_received INTEGER DEFAULT 0,
+            closed INTEGER DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stream_windows (
+            session_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            start_s REAL NOT NULL,
+            end_s REAL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            text TEXT DEFAULT '',
+            error TEXT DEFAULT '',
+            PRIMARY KEY (session_id, idx)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transcription_cache (
+            key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            size INTEGER NOT NULL,
             created_at TEXT NOT NULL,
-            duration INTEGER DEFAULT 0
+            last_used REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS artifacts (
+            recording_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            version TEXT NOT NULL,
+            transcript_hash TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (recording_id, kind)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recording_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_recording ON chat_messages(recording_id, id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS passage_texts (
+            id INTEGER PRIMARY KEY,
+            recording_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            text NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_passage_texts_recording ON passage_texts (recording_id, idx)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS compression_dicts (
+            id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS limiter_slots (
+            id TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            lane TEXT NOT NULL,
+            acquired REAL NOT NULL
         )
     """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS limiter_waiters (
+            id TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            lane TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            since REAL NOT NULL,
+            seen REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS limiter_buckets (
+            provider TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_inflight (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            started REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT DEFAULT '',
+            progress_current INTEGER DEFAULT 0,
+            progress_total INTEGER DEFAULT 0,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT DEFAULT '',
+            recording_id TEXT,
+            attempts INTEGER DEFAULT 0,
+            worker TEXT,
+            heartbeat REAL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+    add_missing_columns(conn, "recordings", [
+        ("encoding_profile", "TEXT DEFAULT ''"),
+        ("encode_ms", "INTEGER DEFAULT 0"),
+        ("version", "INTEGER DEFAULT 0"),
+    ])
+    add_missing_columns(conn, "stream_windows", [("encode_ms", "INTEGER DEFAULT 0")])
+    move_recording_bodies(conn)
+    key_recording_bodies(conn)
+    add_missing_columns(conn, "recording_bodies", [("transcript_version", "INTEGER DEFAULT 0")])
+    # Bumped on every transcript write so cached copies can tell they're stale
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS recording_bodies_transcript_version
+        AFTER UPDATE OF transcript ON recording_bodies BEGIN
+            UPDATE recording_bodies SET transcript_version = OLD.transcript_version + 1 WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_recordings_created")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recordings_page ON recordings (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recordings_version ON recordings (version)")
+    create_list_versioning(conn)
+    create_search_index(conn)
+    create_passage_index(conn)
     conn.commit()
     conn.close()
 
 
-def update_active_recording(field, value):
-    global active_recording_id
-    if not active_recording_id:
+def add_missing_columns(conn, table, columns):
+    """Add columns introduced after a table was first created."""
+    existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+RECORDING_BODY_FIELDS = ("transcript", "summary", "email", "notes")
+
+
+def move_recording_bodies(conn):
+    """Move text fields out of a recordings table created before recording_bodies existed."""
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(recordings)")]
+    if "transcript" not in columns:
         return
-    db = get_db()
-    db.execute(f"UPDATE recordings SET {field} = ? WHERE id = ?", (value, active_recording_id))
+    conn.execute(
+        "INSERT OR IGNORE INTO recording_bodies (recording_id, transcript, summary, email, notes) "
+        "SELECT id, transcript, summary, email, notes FROM recordings"
+    )
+    # Rebuild rather than DROP COLUMN, which older SQLite builds lack
+    keep = ", ".join(c for c in columns if c not in RECORDING_BODY_FIELDS)
+    conn.execute("ALTER TABLE recordings RENAME TO recordings_old")
+    conn.execute("""
+        CREATE TABLE recordings (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT 'Untitled Recording',
+            created_at TEXT NOT NULL,
+            duration INTEGER DEFAULT 0,
+            encoding_profile TEXT DEFAULT '',
+            encode_ms INTEGER DEFAULT 0,
+            version INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute(f"INSERT INTO recordings ({keep}) SELECT {keep} FROM recordings_old")
+    conn.execute("DROP TABLE recordings_old")
+
+
+# The sidebar list carries a version: every insert, delete or change to a
+# listed column bumps list_version and stamps the row (deletes leave a
+# tombstone), so a client can ask for just what changed since the version it
+# has. Triggers keep this right for every writer, including worker processes.
+LISTED_COLUMNS = ("name", "created_at", "duration")
+
+
+def key_recording_bodies(conn):
+    """Give recording_bodies the explicit integer key the search index refers to.
+
+    Implicit rowids may be renumbered by VACUUM; an INTEGER PRIMARY KEY is not.
+    """
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(recording_bodies)")]
+    if "id" in columns:
+        return
+    conn.execute("ALTER TABLE recording_bodies RENAME TO recording_bodies_old")
+    conn.execute("""
+        CREATE TABLE recording_bodies (
+            id INTEGER PRIMARY KEY,
+            recording_id TEXT NOT NULL UNIQUE,
+            transcript TEXT DEFAULT '',
+            summary TEXT DEFAULT '',
+            email TEXT DEFAULT '',
+            notes TEXT DEFAULT ''
+        )
+    """)
+    conn.execute(
+        "INSERT INTO recording_bodies (id, recording_id, transcript, summary, email, notes) "
+        "SELECT rowid, recording_id, transcript, summary, email, notes FROM recording_bodies_old"
+    )
+    conn.execute("DROP TABLE recording_bodies_old")
+
+
+def create_list_versioning(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS list_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO list_version (id, version) VALUES (1, 0)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recording_tombstones (
+            id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recording_tombstones_version ON recording_tombstones (version)")
+    stamp = """
+        UPDATE list_version SET version = version + 1;
+        UPDATE recordings SET version = (SELECT version FROM list_version) WHERE id = NEW.id;
+        DELETE FROM recording_tombstones WHERE id = NEW.id;
+    """
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS recordings_list_insert AFTER INSERT ON recordings BEGIN {stamp} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS recordings_list_update "
+                 f"AFTER UPDATE OF {', '.join(LISTED_COLUMNS)} ON recordings BEGIN {stamp} END")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS recordings_list_delete AFTER DELETE ON recordings BEGIN
+            UPDATE list_version SET version = version + 1;
+            INSERT OR REPLACE INTO recording_tombstones (id, version)
+                VALUES (OLD.id, (SELECT version FROM list_version));
+        END
+    """)
+
+
+# Full-text search over every recording. Stored text is compressed, so the
+# FTS5 tables keep no copy of it: they index views that decode the text.
+# Triggers keep them in sync for every writer; FTS5 removes an entry given
+# its old indexed text, which they get from decode_text(OLD.col). A write
+# joins the other table for the remaining columns, so whichever of a
+# recording's two rows arrives second indexes it, and whichever goes first
+# on delete removes it.
+SEARCH_COLUMNS = ("name", "transcript", "summary", "email")
+# Earlier triggers that copied plain text straight into a self-contained index
+LEGACY_FTS_TRIGGERS = ("recording_search_insert", "recording_search_body", "recording_search_name",
+                       "recording_search_delete")
+
+
+def external_content_fts(conn, name, columns, source, options=""):
+    """Create FTS5 table name over view source, replacing a self-contained one. True if (re)created."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    if row is not None and "content=" in row[0]:
+        return False
+    if row is not None:
+        conn.execute(f"DROP TABLE {name}")
+    conn.execute(f"CREATE VIRTUAL TABLE {name} USING fts5({columns}, content = '{source}', "
+                 f"content_rowid = 'rid'{options})")
+    return True
+
+
+def create_search_index(conn):
+    for trigger in LEGACY_FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("""
+        CREATE VIEW IF NOT EXISTS recording_search_source AS
+            SELECT b.id AS rid, r.name AS name, decode_text(b.transcript) AS transcript,
+                   decode_text(b.summary) AS summary, decode_text(b.email) AS email
+            FROM recording_bodies b JOIN recordings r ON r.id = b.recording_id
+    """)
+    rebuild = external_content_fts(conn, "recording_search", ", ".join(SEARCH_COLUMNS),
+                                   "recording_search_source", ", tokenize = 'porter unicode61'")
+    add = ("INSERT INTO recording_search (rowid, name, transcript, summary, email) "
+           "SELECT b.id, {name}, decode_text({body}.transcript), decode_text({body}.summary), "
+           "decode_text({body}.email) FROM recording_bodies b JOIN recordings r ON r.id = b.recording_id "
+           "WHERE {where};")
+    remove = ("INSERT INTO recording_search (recording_search, rowid, name, transcript, summary, email) "
+              "SELECT 'delete', b.id, {name}, decode_text({body}.transcript), decode_text({body}.summary), "
+              "decode_text({body}.email) FROM recording_bodies b JOIN recordings r ON r.id = b.recording_id "
+              "WHERE {where};")
+    # OLD rows are gone from their table during AFTER DELETE, so those use a one-sided lookup
+    remove_deleted_body = (
+        "INSERT INTO recording_search (recording_search, rowid, name, transcript, summary, email) "
+        "SELECT 'delete', OLD.id, r.name, decode_text(OLD.transcript), decode_text(OLD.summary), "
+        "decode_text(OLD.email) FROM recordings r WHERE r.id = OLD.recording_id;")
+    remove_deleted_recording = (
+        "INSERT INTO recording_search (recording_search, rowid, name, transcript, summary, email) "
+        "SELECT 'delete', b.id, OLD.name, decode_text(b.transcript), decode_text(b.summary), "
+        "decode_text(b.email) FROM recording_bodies b WHERE b.recording_id = OLD.id;")
+    body = dict(name="r.name", where="b.id = NEW.id")
+    triggers = {
+        "recording_search_body_insert": ("AFTER INSERT ON recording_bodies", add.format(body="b", **body)),
+        "recording_search_body_update": (
+            "AFTER UPDATE OF transcript, summary, email ON recording_bodies",
+            remove.format(body="OLD", name="r.name", where="b.id = OLD.id") + add.format(body="b", **body)),
+        "recording_search_body_delete": ("AFTER DELETE ON recording_bodies", remove_deleted_body),
+        "recording_search_recording_insert": (
+            "AFTER INSERT ON recordings", add.format(body="b", name="r.name", where="r.id = NEW.id")),
+        "recording_search_recording_name": (
+            "AFTER UPDATE OF name ON recordings",
+            remove.format(body="b", name="OLD.name", where="r.id = OLD.id")
+            + add.format(body="b", name="r.name", where="r.id = NEW.id")),
+        "recording_search_recording_delete": ("AFTER DELETE ON recordings", remove_deleted_recording),
+    }
+    for name, (event, statements) in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {statements} END")
+    if rebuild:
+        conn.execute("INSERT INTO recording_search (recording_search) VALUES ('rebuild')")
+
+
+def create_passage_index(conn):
+    conn.execute("CREATE VIEW IF NOT EXISTS passage_source AS SELECT id AS rid, decode_text(text) AS text FROM passage_texts")
+    external_content_fts(conn, "passages", "text", "passage_source")
+    add = "INSERT INTO passages (rowid, text) VALUES (NEW.id, decode_text(NEW.text));"
+    remove = "INSERT INTO passages (passages, rowid, text) VALUES ('delete', OLD.id, decode_text(OLD.text));"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS passages_insert AFTER INSERT ON passage_texts BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS passages_update AFTER UPDATE OF text ON passage_texts "
+                 f"BEGIN {remove} {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS passages_delete AFTER DELETE ON passage_texts BEGIN {remove} END")
+
+
+def current_list_version(db):
+    return db.execute("SELECT version FROM list_version WHERE id = 1").fetchone()["version"]
+
+
+def create_recording(db, transcript="", duration=0, encoding=None):
+    rec_id = str(uuid.uuid4())
+    now = _now()
+    encoding = encoding or {}
+    db.execute(
+        "INSERT INTO recordings (id, name, created_at, duration, encoding_profile, encode_ms) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (rec_id, "Untitled Recording", now, duration,
+         encoding.get("profile", ""), encoding.get("encode_ms", 0))
+    )
+    db.execute("INSERT INTO recording_bodies (recording_id, transcript) VALUES (?, ?)",
+               (rec_id, encode_text(transcript)))
     db.commit()
+    return {"id": rec_id, "name": "Untitled Recording", "created_at": now}
+
+
+def update_recording(rec_id, **fields):
+    """Write fields on one recording. Usable outside a request (workers, threads)."""
+    body = {k: encode_text(v) for k, v in fields.items() if k in RECORDING_BODY_FIELDS}
+    meta = {k: v for k, v in fields.items() if k not in RECORDING_BODY_FIELDS}
+    conn = connect_db()
+    try:
+        if meta:
+            cols = ", ".join(f"{k} = ?" for k in meta)
+            conn.execute(f"UPDATE recordings SET {cols} WHERE id = ?", (*meta.values(), rec_id))
+        if body:
+            cols = ", ".join(f"{k} = ?" for k in body)
+            conn.execute(f"UPDATE recording_bodies SET {cols} WHERE recording_id = ?", (*body.values(), rec_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Transcripts of recently used recordings, so endpoints that receive only a
+# recording_id don't re-read and decompress the transcript on every chat turn.
+# An entry is reused while the row's transcript_version still matches; a
+# trigger bumps it on every write, including other processes (live
+# transcription, workers).
+RECORDING_TEXT_CACHE_ENTRIES = 32
+recording_text_cache = OrderedDict()
+recording_text_lock = threading.Lock()
+
+
+def recording_texts(rec_id):
+    """Return (transcript, summary) for a recording, or None if it doesn't exist."""
+    conn = connect_db()
+    try:
+        row = conn.execute("SELECT transcript_version, summary FROM recording_bodies WHERE recording_id = ?",
+                           (rec_id,)).fetchone()
+        if row is None:
+            return None
+        summary = decode_text(row["summary"]) or ""
+        with recording_text_lock:
+            cached = recording_text_cache.get(rec_id)
+            if cached is not None and cached[0] == row["transcript_version"]:
+                recording_text_cache.move_to_end(rec_id)
+                return cached[1], summary
+        stored = conn.execute("SELECT transcript FROM recording_bodies WHERE recording_id = ?",
+                              (rec_id,)).fetchone()["transcript"]
+    finally:
+        conn.close()
+    transcript = decode_text(stored) or ""
+    with recording_text_lock:
+        recording_text_cache[rec_id] = (row["transcript_version"], transcript)
+        while len(recording_text_cache) > RECORDING_TEXT_CACHE_ENTRIES:
+            recording_text_cache.popitem(last=False)
+    return transcript, summary
+
+
+def request_texts():
+    """Transcript and summary for this request.
+
+    Saved recordings are referenced by recording_id and loaded server-side;
+    the full-body form is still accepted for text that was never saved.
+    """
+    data = request.json or {}
+    transcript = data.get("transcript", "")
+    summary = data.get("summary", "")
+    rec_id = data.get("recording_id")
+    if rec_id and not transcript:
+        stored = recording_texts(rec_id)
+        if stored:
+            transcript, summary = stored[0], summary or stored[1]
+    return transcript, summary
+
+
+# Derived data (analysis, generated name) stored per recording. An artifact is
+# fresh while both the transcript and the prompt/model version that produced
+# it are unchanged; bump a version here when its prompt changes.
+ARTIFACT_VERSIONS = {
+    "analysis": "analysis-v1",
+    "name": "name-v1",
+    "passages": "passages-v3",
+}
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def artifact_version(kind):
+    return f"{CLAUDE_MODEL}/{ARTIFACT_VERSIONS[kind]}"
+
+
+def load_artifact(db, rec_id, kind, transcript):
+    """Return the stored artifact content, or None if missing or stale."""
+    row = db.execute(
+        "SELECT content, version, transcript_hash FROM artifacts WHERE recording_id = ? AND kind = ?",
+        (rec_id, kind)
+    ).fetchone()
+    if row is None or row["version"] != artifact_version(kind) or row["transcript_hash"] != text_hash(transcript):
+        return None
+    return row["content"]
+
+
+def save_artifact(rec_id, kind, transcript, content):
+    conn = connect_db()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO artifacts (recording_id, kind, version, transcript_hash, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rec_id, kind, artifact_version(kind), text_hash(transcript), content, _now())
+        )
+        conn.commit()
+    finally:
+        conn.close()
 
 
 init_db()
 
 
-def get_claude():
-    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# ─── Jobs ───
+#
+# Long transcription and summarization work runs in separate worker
+# processes (`flask --app app worker`), not in the request handler. Jobs
+# are rows in SQLite: endpoints enqueue and return a job id, workers claim
+# jobs atomically and report progress, and the browser polls /api/jobs/<id>.
+# A worker heartbeats while it runs a job, so a job whose worker died is
+# picked up again by another one.
 
+JOB_POLL_SECONDS = 1
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 60                 # a running job with no heartbeat for this long is requeued
+JOB_MAX_ATTEMPTS = 3
 
-def call_claude(fn):
-    last_error = None
-    for attempt in range(RETRY_ATTEMPTS):
+job_handlers = {}
+
+
+def job_handler(kind):
+    def register(fn):
+        job_handlers[kind] = fn
+        return fn
+    return register
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def enqueue_job(kind, payload, recording_id=None, status="queued", result=None):
+    job_id = str(uuid.uuid4())
+    now = _now()
+    conn = connect_db()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, status, payload, result, recording_id, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, status, json_mod.dumps(payload),
+             json_mod.dumps(result) if result is not None else None, recording_id, now, now)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+
+def update_job(job_id, **fields):
+    fields["updated_at"] = _now()
+    if "result" in fields:
+        fields["result"] = json_mod.dumps(fields["result"])
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    conn = connect_db()
+    try:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class JobProgress:
+    """Handed to job handlers to report the current stage, step i of n and any partial result."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __call__(self, stage, current=0, total=0, result=None):
+        fields = {}
+        if result is not None:
+            fields["result"] = result  # partial result, readable while the job runs
+        update_job(self.job_id, stage=stage, progress_current=current, progress_total=total,
+                   heartbeat=time.time(), **fields)
+
+
+def claim_job(worker):
+    conn = connect_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        stale = time.time() - JOB_STALE_SECONDS
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker died too many times' "
+            "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?", (stale, JOB_MAX_ATTEMPTS)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?", (stale,)
+        )
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?", (worker, time.time(), _now(), row["id"])
+            )
+        conn.commit()
+        return row
+    finally:
+        conn.close()
+
+
+class JobError(Exception):
+    """A job failure whose message is shown to the user as-is."""
+
+
+def run_job(job, worker):
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            update_job(job["id"], heartbeat=time.time())
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    t0 = time.time()
+    try:
+        result = run_in_lane("bulk", job_handlers[job["kind"]], json_mod.loads(job["payload"]), JobProgress(job["id"]))
+        update_job(job["id"], status="done", stage="done", result=result)
+        app.logger.info(f"Job {job['kind']} {job['id']} done in {time.time() - t0:.1f}s on {worker}")
+    except Exception as e:
+        app.logger.error(f"Job {job['kind']} {job['id']} failed: {traceback.format_exc()}")
+        message = str(e) if isinstance(e, JobError) else api_error_message(e)[0]
+        update_job(job["id"], status="failed", error=message)
+    finally:
+        stop.set()
+
+
+def run_worker(name=None):
+    worker = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    app.logger.info(f"Job worker {worker} started")
+    with app.app_context():
+        while True:
+            job = claim_job(worker)
+            if job is None:
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            run_job(job, worker)
+
+
+@app.cli.command("worker")
+@click.option("--threads", default=1, show_default=True, help="Jobs to run concurrently in this process.")
+def worker_command(threads):
+    """Run background transcription and summarization jobs."""
+    for _ in range(threads - 1):
+        threading.Thread(target=run_worker, daemon=True).start()
+    run_worker()
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    row = get_db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "stage": row["stage"],
+        "progress": {"current": row["progress_current"], "total": row["progress_total"]},
+        "recording_id": row["recording_id"],
+        "result": json_mod.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+    })
+
+
+# ─── API clients ───
+#
+# One Anthropic and one OpenAI client per process, created on first use and
+# shared by every thread, so calls reuse pooled keep-alive connections
+# instead of paying a TCP + TLS handshake each time. A forked child
+# (gunicorn worker) drops the parent's clients and builds its own, since
+# pooled sockets must not be shared across processes.
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 10))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", 60))
+CLAUDE_TIMEOUT_SECONDS = float(os.getenv("CLAUDE_TIMEOUT_SECONDS", 300))
+WHISPER_TIMEOUT_SECONDS = float(os.getenv("WHISPER_TIMEOUT_SECONDS", 300))
+CONNECTION_LOG_EVERY = 50              # log pool reuse every N requests
+
+api_clients = {}
+api_clients_lock = threading.Lock()
+connection_stats = {"requests": 0, "new_connections": 0}
+
+
+def _reset_api_clients():
+    global api_clients_lock
+    api_clients.clear()
+    api_clients_lock = threading.Lock()
+    connection_stats.update(requests=0, new_connections=0)
+
+
+os.register_at_fork(after_in_child=_reset_api_clients)
+
+
+def _trace_connection(event_name, info):
+    if event_name == "connection.connect_tcp.complete":
+        with api_clients_lock:
+            connection_stats["new_connections"] += 1
+
+
+def _on_request(req):
+    req.extensions["trace"] = _trace_connection
+    with api_clients_lock:
+        connection_stats["requests"] += 1
+        requests, opened = connection_stats["requests"], connection_stats["new_connections"]
+    if requests % CONNECTION_LOG_EVERY == 0:
+        app.logger.info(f"HTTP pool: {requests} requests over {opened} new connections "
+                        f"({1 - opened / requests:.0%} reused)")
+
+
+def _http_client(sdk):
+    return sdk.DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+        event_hooks={"request": [_on_request]},
+    )
+
+
+def get_claude():
+    with api_clients_lock:
+        if "anthropic" not in api_clients:
+            api_clients["anthropic"] = anthropic.Anthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=CLAUDE_TIMEOUT_SECONDS, max_retries=0,
+                http_client=_http_client(anthropic),
+            )
+        return api_clients["anthropic"]
+
+
+def get_openai():
+    with api_clients_lock:
+        if "openai" not in api_clients:
+            api_clients["openai"] = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"), timeout=WHISPER_TIMEOUT_SECONDS, max_retries=0,
+                http_client=_http_client(openai),
+            )
+        return api_clients["openai"]
+
+
+# ─── Outbound limiter ───
+#
+# Admission control for every Claude and Whisper call, shared by all
+# processes through SQLite. Each provider has a token bucket (requests per
+# minute, bursting up to the concurrency cap) and a cap on calls in flight.
+# Waiting callers are served strictly by lane, then arrival: "interactive"
+# (chat, email edits, anything a user is watching) goes ahead of "bulk"
+# (background jobs, summary map/reduce calls, Whisper). Slots and waiters
+# left behind by a crashed process expire on their own.
+
+LANES = {"interactive": 0, "bulk": 1}
+CLAUDE_MAX_CONCURRENT = int(os.getenv("CLAUDE_MAX_CONCURRENT", 8))
+CLAUDE_REQUESTS_PER_MINUTE = float(os.getenv("CLAUDE_REQUESTS_PER_MINUTE", 50))
+WHISPER_MAX_CONCURRENT = int(os.getenv("WHISPER_MAX_CONCURRENT", 8))
+WHISPER_REQUESTS_PER_MINUTE = float(os.getenv("WHISPER_REQUESTS_PER_MINUTE", 50))
+LIMITER_MAX_WAIT_SECONDS = float(os.getenv("LIMITER_MAX_WAIT_SECONDS", 300))
+LIMITER_POLL_SECONDS = 0.05
+LIMITER_WAITER_TTL = 10                # a waiter not seen for this long has gone away
+LIMITER_LEASE_SECONDS = 900            # a slot held this long belonged to a dead process
+
+call_lane = contextvars.ContextVar("call_lane", default="interactive")
+
+
+def run_in_lane(lane, fn, *args):
+    """Run fn with outbound calls made in the given lane (also across pool threads)."""
+    ctx = contextvars.copy_context()
+    ctx.run(call_lane.set, lane)
+    return ctx.run(fn, *args)
+
+
+class LimiterTimeout(Exception):
+    """No outbound slot became free within LIMITER_MAX_WAIT_SECONDS."""
+
+
+class OutboundLimiter:
+    def __init__(self, provider, max_concurrent, per_minute):
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self.rate = per_minute / 60
+        self.burst = max(1, max_concurrent)
+        self.stats_lock = threading.Lock()
+        self.waits = {lane: {"calls": 0, "wait_total": 0.0, "wait_max": 0.0} for lane in LANES}
+
+    def _take(self, conn, now):
+        in_flight = conn.execute("SELECT COUNT(*) FROM limiter_slots WHERE provider = ?",
+                                 (self.provider,)).fetchone()[0]
+        if in_flight >= self.max_concurrent:
+            return False
+        row = conn.execute("SELECT tokens, updated FROM limiter_buckets WHERE provider = ?",
+                           (self.provider,)).fetchone()
+        tokens = self.burst if row is None else min(self.burst, row["tokens"] + (now - row["updated"]) * self.rate)
+        if tokens < 1:
+            return False
+        conn.execute("INSERT OR REPLACE INTO limiter_buckets (provider, tokens, updated) VALUES (?, ?, ?)",
+                     (self.provider, tokens - 1, now))
+        return True
+
+    def _acquire(self, lane):
+        me, t0 = str(uuid.uuid4()), time.time()
+        conn = connect_db()
         try:
-            return fn()
-        except anthropic.RateLimitError as e:
-            last_error = e
-            time.sleep(RETRY_DELAY * (attempt + 1))
-        except anthropic.APITimeoutError as e:
-            last_error = e
-            time.sleep(RETRY_DELAY * (attempt + 1))
-        except anthropic.BadRequestError:
+            conn.execute(
+                "INSERT INTO limiter_waiters (id, provider, lane, priority, since, seen) VALUES (?, ?, ?, ?, ?, ?)",
+                (me, self.provider, lane, LANES[lane], t0, t0)
+            )
+            conn.commit()
+            while True:
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM limiter_slots WHERE provider = ? AND acquired < ?",
+                             (self.provider, now - LIMITER_LEASE_SECONDS))
+                conn.execute("DELETE FROM limiter_waiters WHERE provider = ? AND seen < ?",
+                             (self.provider, now - LIMITER_WAITER_TTL))
+                conn.execute("UPDATE limiter_waiters SET seen = ? WHERE id = ?", (now, me))
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM limiter_waiters WHERE provider = ? AND id != ? AND "
+                    "(priority < ? OR (priority = ? AND (since < ? OR (since = ? AND id < ?))))",
+                    (self.provider, me, LANES[lane], LANES[lane], t0, t0, me)
+                ).fetchone()[0]
+                if ahead == 0 and self._take(conn, now):
+                    conn.execute("DELETE FROM limiter_waiters WHERE id = ?", (me,))
+                    conn.execute("INSERT INTO limiter_slots (id, provider, lane, acquired) VALUES (?, ?, ?, ?)",
+                                 (me, self.provider, lane, now))
+                    conn.commit()
+                    self._record_wait(lane, now - t0)
+                    return me
+                conn.commit()
+                if now - t0 > LIMITER_MAX_WAIT_SECONDS:
+                    raise LimiterTimeout(f"{self.provider}: no capacity after {LIMITER_MAX_WAIT_SECONDS:.0f}s")
+                time.sleep(LIMITER_POLL_SECONDS * random.uniform(0.5, 1.5))
+        except BaseException:
+            conn.rollback()
+            conn.execute("DELETE FROM limiter_waiters WHERE id = ?", (me,))
+            conn.commit()
             raise
-        except anthropic.APIError as e:
-            last_error = e
-            if attempt < RETRY_ATTEMPTS - 1:
-                time.sleep(RETRY_DELAY)
+        finally:
+            conn.close()
+
+    def _release(self, slot_id):
+        conn = connect_db()
+        try:
+            conn.execute("DELETE FROM limiter_slots WHERE id = ?", (slot_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _record_wait(self, lane, waited):
+        with self.stats_lock:
+            w = self.waits[lane]
+            w["calls"] += 1
+            w["wait_total"] += waited
+            w["wait_max"] = max(w["wait_max"], waited)
+        if waited > 1:
+            app.logger.info(f"Limiter {self.provider}: {lane} call waited {waited:.1f}s")
+
+    @contextmanager
+    def slot(self, lane=None):
+        slot_id = self._acquire(lane or call_lane.get())
+        try:
+            yield
+        finally:
+            self._release(slot_id)
+
+    def state(self):
+        """Queue depth and calls in flight (all processes), wait times (this process)."""
+        conn = connect_db()
+        try:
+            queued = dict(conn.execute("SELECT lane, COUNT(*) FROM limiter_waiters WHERE provider = ? GROUP BY lane",
+                                       (self.provider,)).fetchall())
+            in_flight = conn.execute("SELECT COUNT(*) FROM limiter_slots WHERE provider = ?",
+                                     (self.provider,)).fetchone()[0]
+        finally:
+            conn.close()
+        with self.stats_lock:
+            waits = {lane: {"calls": w["calls"], "wait_max": round(w["wait_max"], 3),
+                            "wait_avg": round(w["wait_total"] / w["calls"], 3) if w["calls"] else 0}
+                     for lane, w in self.waits.items()}
+        return {"in_flight": in_flight, "queued": {lane: queued.get(lane, 0) for lane in LANES}, "waits": waits}
+
+
+claude_limiter = OutboundLimiter("anthropic", CLAUDE_MAX_CONCURRENT, CLAUDE_REQUESTS_PER_MINUTE)
+whisper_limiter = OutboundLimiter("openai", WHISPER_MAX_CONCURRENT, WHISPER_REQUESTS_PER_MINUTE)
+
+
+# ─── Retries ───
+#
+# Provider calls go through a RetryPolicy: transient failures are retried
+# with full-jitter exponential backoff (or the server's Retry-After, if
+# longer), and a circuit breaker shared by every thread in the process
+# fails calls fast once the provider has failed repeatedly, instead of
+# letting each request queue up its own retries against an outage. The
+# SDKs' built-in retries are disabled so this is the only retry layer.
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", 1))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", 30))
+RETRY_AFTER_MAX_SECONDS = 60           # never sleep longer than this on a server hint
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", 30))
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+
+def _retry_after(e):
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers, or 0."""
+    response = getattr(e, "response", None)
+    if response is None:
+        return 0
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return 0
+        try:
+            return float(value)
+        except ValueError:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+def transient_error(sdk):
+    """Predicate for failures of an Anthropic/OpenAI SDK call that are worth retrying."""
+    def check(e):
+        if isinstance(e, sdk.APIConnectionError):  # includes timeouts
+            return True
+        return isinstance(e, sdk.APIStatusError) and (e.status_code in (408, 409, 429) or e.status_code >= 500)
+    return check
+
+
+class RetryPolicy:
+    """Retry transient failures and trip a breaker on repeated ones.
+
+    Attempt n sleeps uniform(0, min(max_delay, base * 2**n)), or Retry-After
+    if the server sent a longer one. After `threshold` consecutive transient
+    failures the circuit opens for `cooldown` seconds; then a single trial
+    call is let through, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, is_transient, limiter=None, attempts=RETRY_ATTEMPTS, base=RETRY_BASE_SECONDS,
+                 max_delay=RETRY_MAX_SECONDS, threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.is_transient = is_transient
+        self.limiter = limiter
+        self.attempts = attempts
+        self.base = base
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def _admit(self):
+        with self.lock:
+            if self.failures < self.threshold:
+                return
+            if time.time() < self.open_until or self.probing:
+                raise CircuitOpenError(f"{self.name} is failing; not retrying for a few seconds")
+            self.probing = True
+
+    def _record(self, transient_failure):
+        """Update the breaker; returns True if the circuit is now open."""
+        with self.lock:
+            self.probing = False
+            if not transient_failure:
+                self.failures = 0
+                return False
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            self.open_until = time.time() + self.cooldown
+        app.logger.warning(f"{self.name}: circuit open for {self.cooldown:.0f}s "
+                           f"after {self.failures} consecutive failures")
+        return True
+
+    def delay(self, attempt, e):
+        backoff = random.uniform(0, min(self.max_delay, self.base * 2 ** attempt))
+        return max(backoff, min(_retry_after(e), RETRY_AFTER_MAX_SECONDS))
+
+    def call(self, fn, lane=None, limited=True):
+        """Run fn with retries; each attempt holds an outbound slot unless limited=False."""
+        for attempt in range(self.attempts):
+            self._admit()
+            try:
+                with self.limiter.slot(lane) if self.limiter and limited else nullcontext():
+                    result = fn()
+            except Exception as e:
+                transient = self.is_transient(e)
+                tripped = self._record(transient)
+                if not transient or tripped or attempt == self.attempts - 1:
+                    raise
+                wait = self.delay(attempt, e)
+                app.logger.warning(f"{self.name}: {type(e).__name__}, retry {attempt + 1}/{self.attempts - 1} "
+                                   f"in {wait:.1f}s")
+                time.sleep(wait)
             else:
-                raise
-    raise last_error
-
-
-def chunk_transcript(transcript):
-    if len(transcript) <= MAX_CHARS_PER_CHUNK:
-        return [transcript]
-    chunks, current, current_len = [], [], 0
-    for word in transcript.split():
-        wl = len(word) + 1
-        if current_len + wl > MAX_CHARS_PER_CHUNK:
-            chunks.append(" ".join(current))
-            current, current_len = [word], wl
-        else:
-            current.append(word)
-            current_len += wl
-    if current:
-        chunks.append(" ".join(current))
-    return chunks
+                self._record(False)
+                return result
 
+    def state(self):
+        with self.lock:
+            is_open = self.failures >= self.threshold and time.time() < self.open_until
+            return {"failures": self.failures, "open": is_open}
 
-def handle_api_error(e):
+
+claude_retry = RetryPolicy("Claude", transient_error(anthropic), claude_limiter)
+whisper_retry = RetryPolicy("Whisper", transient_error(openai), whisper_limiter)
+
+
+def call_claude(fn):
+    return claude_retry.call(fn)
+
+
+# ─── Claude responses ───
+
+def api_error_message(e):
+    """Map an exception to a user-facing (message, HTTP status)."""
     error_msg = str(e)
     if isinstance(e, anthropic.AuthenticationError):
-        return jsonify({"error": "Invalid API key. Check ANTHROPIC_API_KEY in .env"}), 401
+        return "Invalid API key. Check ANTHROPIC_API_KEY in .env", 401
     if isinstance(e, anthropic.BadRequestError):
         if "credit balance" in error_msg.lower():
-            return jsonify({"error": "No API credits. Add credits at console.anthropic.com -> Plans & Billing"}), 402
-        return jsonify({"error": f"API error: {error_msg}"}), 400
+            return "No API credits. Add credits at console.anthropic.com -> Plans & Billing", 402
+        return f"API error: {error_msg}", 400
     if isinstance(e, anthropic.RateLimitError):
-        return jsonify({"error": "Rate limited. Wait a moment and try again."}), 429
+        return "Rate limited. Wait a moment and try again.", 429
     if isinstance(e, anthropic.APITimeoutError):
-        return jsonify({"error": "API timed out after retries. Try again."}), 504
-    app.logger.error(f"Error: {traceback.format_exc()}")
-    return jsonify({"error": f"Unexpected error: {error_msg}"}), 500
+        return "API timed out after retries. Try again.", 504
+    if isinstance(e, CircuitOpenError):
+        return "The AI service is having trouble. Try again in a minute.", 503
+    if isinstance(e, LimiterTimeout):
+        return "Too many requests in progress. Try again in a minute.", 503
+    return f"Unexpected error: {error_msg}", 500
+
+
+def handle_api_error(e):
+    message, status = api_error_message(e)
+    if status == 500:
+        app.logger.error(f"Error: {traceback.format_exc()}")
+    return jsonify({"error": message}), status
+
+
+def recording_writer(field):
+    """Return a callback that saves generated text on the recording this request is about."""
+    rec_id = (request.json or {}).get("recording_id")
+
+    def write(text):
+        if rec_id:
+            update_recording(rec_id, **{field: text})
+    return write
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json_mod.dumps(data)}\n\n"
+
+
+def stream_claude(prepare, field, on_complete=None, cache=False):
+    """Relay a Claude completion to the browser as server-sent events.
+
+    prepare(progress) returns the messages.create kwargs. It runs first, so
+    endpoints with a map phase (summaries) can report "progress" events.
+    Then one "delta" event is sent per text chunk, and finally "done" with
+    the full text (after on_complete has persisted it) or "error". A cached
+    answer is sent as a single delta.
+    """
+    def generate():
+        events = queue.Queue()
+        prepared = {}
+
+        def run_prepare():
+            try:
+                prepared["kwargs"] = prepare(lambda stage, current=0, total=0: events.put(
+                    {"stage": stage, "current": current, "total": total}))
+            except Exception as e:
+                prepared["error"] = e
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run_prepare, daemon=True).start()
+        while (event := events.get()) is not None:
+            yield _sse("progress", event)
+
+        try:
+            if "error" in prepared:
+                raise prepared["error"]
+            key = llm_cache_key(prepared["kwargs"]) if cache else None
+            text = llm_cache_get(key) if key else None
+            relayed = False
+            if text is None:
+                with single_flight(key) if key else nullcontext() as text:
+                    if text is None:
+                        text = yield from _relay_claude_stream(prepared["kwargs"], field)
+                        relayed = True
+                        if key:
+                            llm_cache_put(key, text)
+            if not relayed:
+                yield _sse("delta", {"text": text})
+            if on_complete:
+                on_complete(text)
+            yield _sse("done", {field: text})
+        except Exception as e:
+            message, status = api_error_message(e)
+            if status == 500:
+                app.logger.error(f"Stream error: {traceback.format_exc()}")
+            yield _sse("error", {"error": message, "status": status})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _relay_claude_stream(request_kwargs, field):
+    """Yield SSE deltas from a streamed completion; returns the full text."""
+    client = get_claude()
+    t0 = time.time()
+    # The slot is held until the last token, not just until the stream opens
+    with claude_limiter.slot():
+        stream = claude_retry.call(
+            lambda: client.messages.create(model=CLAUDE_MODEL, stream=True, **request_kwargs),
+            limited=False,
+        )
+        parts, usage = [], None
+        for event in stream:
+            if event.type == "message_start":
+                usage = usage_counts(event.message.usage)
+            elif event.type == "message_delta" and usage:
+                usage["output_tokens"] = event.usage.output_tokens
+            elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                if not parts:
+                    app.logger.info(f"Stream {field}: first token after {time.time() - t0:.2f}s")
+                parts.append(event.delta.text)
+                yield _sse("delta", {"text": event.delta.text})
+    if usage:
+        record_usage(field, usage)
+    return "".join(parts)
+
+
+def complete_or_stream(request_kwargs, field, on_complete=None):
+    """Answer with one JSON blob, or as server-sent events on the /stream variant."""
+    if request.path.endswith("/stream"):
+        return stream_claude(lambda progress: request_kwargs, field, on_complete)
+    try:
+        text = ask_claude(request_kwargs, label=field)
+        if on_complete:
+            on_complete(text)
+        return jsonify({field: text})
+    except Exception as e:
+        return handle_api_error(e)
+
+
+# ─── LLM response cache ───
+#
+# Completions for deterministic prompts (analysis, names, summaries) keyed on
+# the full request: model, max_tokens and a hash of the messages. A small
+# in-process LRU sits in front of the llm_cache table, which is shared by
+# every worker process and survives restarts.
+
+LLM_CACHE_MEMORY_ENTRIES = 256
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 20 * 1024 * 1024))
+
+llm_cache_memory = OrderedDict()
+llm_cache_lock = threading.Lock()
+llm_cache_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+
+def llm_cache_key(request_kwargs):
+    body = json_mod.dumps({"model": CLAUDE_MODEL, **request_kwargs}, sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _llm_cache_remember(key, text, created_at=None):
+    """Keep an entry in memory, aged from when it was first cached (default now)."""
+    with llm_cache_lock:
+        llm_cache_memory[key] = (text, created_at or time.time())
+        llm_cache_memory.move_to_end(key)
+        while len(llm_cache_memory) > LLM_CACHE_MEMORY_ENTRIES:
+            llm_cache_memory.popitem(last=False)
+
+
+def _llm_cache_count(stat):
+    with llm_cache_lock:
+        llm_cache_stats[stat] += 1
+
+
+def llm_cache_get(key, count=True):
+    cutoff = time.time() - LLM_CACHE_TTL_SECONDS
+    with llm_cache_lock:
+        entry = llm_cache_memory.get(key)
+        if entry and entry[1] >= cutoff:
+            llm_cache_memory.move_to_end(key)
+            if count:
+                llm_cache_stats["memory_hits"] += 1
+            return entry[0]
+
+    conn = connect_db()
+    try:
+        row = conn.execute("SELECT text, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row["created_at"] < cutoff:
+            if count:
+                _llm_cache_count("misses")
+            return None
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+    finally:
+        conn.close()
+    if count:
+        _llm_cache_count("db_hits")
+    # Keep the row's age, so the copy expires with it
+    _llm_cache_remember(key, row["text"], row["created_at"])
+    return row["text"]
+
+
+def llm_cache_put(key, text):
+    _llm_cache_remember(key, text)
+    conn = connect_db()
+    try:
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, text, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, text, len(text.encode()), now, now)
+        )
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL_SECONDS,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > LLM_CACHE_MAX_BYTES:
+            for row in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall():
+                if total <= LLM_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (row["key"],))
+                total -= row["size"]
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Single flight: concurrent identical cached calls (a double-clicked button,
+# a second tab) share one upstream request. Callers in this process wait on
+# the leader's event; callers in other processes see its llm_inflight row
+# and poll until the answer lands in the cache. A row older than
+# INFLIGHT_TTL_SECONDS belonged to a leader that died and can be taken over.
+
+INFLIGHT_TTL_SECONDS = 600
+INFLIGHT_POLL_SECONDS = 0.25
+
+inflight_local = {}
+inflight_lock = threading.Lock()
+coalesce_stats = {"leaders": 0, "local_duplicates": 0, "remote_duplicates": 0}
+
+
+def _coalesce_count(stat):
+    with inflight_lock:
+        coalesce_stats[stat] += 1
+
+
+def _claim_inflight(key):
+    conn = connect_db()
+    try:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM llm_inflight WHERE key = ? AND started < ?", (key, now - INFLIGHT_TTL_SECONDS))
+        try:
+            conn.execute("INSERT INTO llm_inflight (key, owner, started) VALUES (?, ?, ?)",
+                         (key, f"{socket.gethostname()}:{os.getpid()}", now))
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def _inflight_elsewhere(key):
+    conn = connect_db()
+    try:
+        return conn.execute("SELECT 1 FROM llm_inflight WHERE key = ? AND started >= ?",
+                            (key, time.time() - INFLIGHT_TTL_SECONDS)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _release_inflight(key):
+    conn = connect_db()
+    try:
+        conn.execute("DELETE FROM llm_inflight WHERE key = ?", (key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@contextmanager
+def single_flight(key):
+    """Coalesce concurrent calls for one cache key.
+
+    Yields None to the caller that should make the upstream call (it must
+    llm_cache_put the answer before leaving the block), or the answer to a
+    caller that arrived while an identical call was in flight. If the
+    leader fails, waiting callers get None and make their own call.
+    """
+    with inflight_lock:
+        leader_done = inflight_local.get(key)
+        if leader_done is None:
+            inflight_local[key] = done = threading.Event()
+    if leader_done is not None:
+        _coalesce_count("local_duplicates")
+        leader_done.wait(INFLIGHT_TTL_SECONDS)
+        yield llm_cache_get(key, count=False)
+        return
+
+    try:
+        counted = False
+        while not _claim_inflight(key):
+            if not counted:
+                _coalesce_count("remote_duplicates")
+                counted = True
+            while _inflight_elsewhere(key):
+                time.sleep(INFLIGHT_POLL_SECONDS)
+            text = llm_cache_get(key, count=False)
+            if text is not None:
+                yield text
+                return
+        _coalesce_count("leaders")
+        try:
+            yield None
+        finally:
+            _release_inflight(key)
+    finally:
+        with inflight_lock:
+            inflight_local.pop(key, None)
+        done.set()
+
+
+# Token usage per call, with input split into fresh, cache-read and cache-write
+# tokens so the effect of prompt caching is visible in logs and /api/metrics.
+USAGE_FIELDS = ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens")
+claude_usage_stats = dict.fromkeys(("calls",) + USAGE_FIELDS, 0)
+
+
+def usage_counts(usage):
+    return {k: getattr(usage, k, 0) or 0 for k in USAGE_FIELDS}
+
+
+def record_usage(label, counts):
+    with llm_cache_lock:
+        claude_usage_stats["calls"] += 1
+        for k, v in counts.items():
+            claude_usage_stats[k] += v
+    app.logger.info(
+        f"Claude {label}: input={counts['input_tokens']} cache_read={counts['cache_read_input_tokens']} "
+        f"cache_write={counts['cache_creation_input_tokens']} output={counts['output_tokens']}"
+    )
+
+
+def ask_claude(request_kwargs, cache=False, check=None, label="completion"):
+    """Run one completion and return its text.
+
+    With cache=True the response cache is consulted first, identical calls
+    already in flight are joined, and the answer is stored afterwards.
+    check(text) may raise to keep a bad answer (e.g. unparseable JSON) out
+    of the cache.
+    """
+    if not cache:
+        return _complete(request_kwargs, check, label)
+    key = llm_cache_key(request_kwargs)
+    text = llm_cache_get(key)
+    if text is not None:
+        return text
+    with single_flight(key) as shared:
+        if shared is not None:
+            return shared
+        text = _complete(request_kwargs, check, label)
+        llm_cache_put(key, text)
+        return text
+
+
+def _complete(request_kwargs, check, label):
+    client = get_claude()
+    msg = call_claude(lambda: client.messages.create(model=CLAUDE_MODEL, **request_kwargs))
+    record_usage(label, usage_counts(msg.usage))
+    text = msg.content[0].text
+    if check:
+        check(text)
+    return text
+
+
+# ─── Transcript chunking ───
+#
+# Long transcripts are cut into chunks that fit a token budget derived from
+# the model's context window. Tokens are estimated from characters, which is
+# close enough for English speech. Chunks are (start, end) offsets into the
+# transcript rather than copies, and end at a speaker turn, paragraph,
+# sentence or word break, in that order of preference.
+
+CHARS_PER_TOKEN = 4
+MODEL_CONTEXT_TOKENS = {"claude-sonnet-4-5-20250929": 200_000}
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS") or 0) or MODEL_CONTEXT_TOKENS.get(CLAUDE_MODEL, 200_000) // 2
+CHUNK_OVERLAP_TOKENS = 250
+
+SPEAKER_TURN = re.compile(r"\n(?=[A-Z][\w .'-]{0,40}:)")
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _last_match_end(pattern, text, lo, hi):
+    end = None
+    for m in pattern.finditer(text, lo, hi):
+        end = m.end()
+    return end
+
+
+def _cut_point(text, start, limit):
+    """Where to end a chunk that may not extend past limit."""
+    lo = start + (limit - start) // 2
+    cut = _last_match_end(SPEAKER_TURN, text, lo, limit)
+    if cut is None:
+        cut = text.rfind("\n", lo, limit) + 1 or None
+    if cut is None:
+        cut = _last_match_end(SENTENCE_END, text, lo, limit)
+    if cut is None:
+        cut = text.rfind(" ", lo, limit) + 1 or None
+    return cut or limit
+
+
+def iter_chunk_spans(text, max_tokens=None, overlap_tokens=None):
+    """Yield (start, end) offsets of chunks of at most max_tokens (estimated).
+
+    Each chunk after the first starts overlap_tokens before the previous one
+    ended, on a word break. The overlap is capped at a quarter of the chunk
+    size; chunks are at least half of it, so every step moves forward by at
+    least a quarter. Nothing is copied, so counting chunks takes constant memory.
+    """
+    max_chars = (max_tokens or CHUNK_TOKENS) * CHARS_PER_TOKEN
+    overlap = (CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens) * CHARS_PER_TOKEN
+    overlap = min(overlap, max_chars // 4)
+    start, n = 0, len(text)
+    while start < n:
+        if n - start <= max_chars:
+            yield start, n
+            return
+        end = _cut_point(text, start, start + max_chars)
+        yield start, end
+        next_start = end - overlap
+        if overlap:
+            space = text.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        start = max(next_start, start + 1)
+
+
+def count_chunks(text):
+    return sum(1 for _ in iter_chunk_spans(text))
+
+
+# ─── Transcription cache ───
+#
+# Whisper results keyed by a hash of the exact bytes sent: the raw upload
+# ("upload:") and every file handed to Whisper ("audio:"). A retried or
+# duplicate upload returns without decoding, and a long job that failed
+# part-way only re-sends the chunks that never succeeded.
+
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def transcription_cache_get(key):
+    conn = connect_db()
+    try:
+        row = conn.execute("SELECT text FROM transcription_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE transcription_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return decode_text(row["text"])
+    finally:
+        conn.close()
+
+
+def transcription_cache_put(key, text):
+    stored = encode_text(text)
+    conn = connect_db()
+    try:
+        now = _now()
+        conn.execute(
+            "INSERT OR REPLACE INTO transcription_cache (key, text, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, stored, len(stored if isinstance(stored, bytes) else stored.encode()), now, time.time())
+        )
+        # Evict least recently used entries once the cache is over its size budget
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcription_cache").fetchone()[0]
+        if total > TRANSCRIPTION_CACHE_MAX_BYTES:
+            for row in conn.execute("SELECT key, size FROM transcription_cache ORDER BY last_used").fetchall():
+                if total <= TRANSCRIPTION_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM transcription_cache WHERE key = ?", (row["key"],))
+                total -= row["size"]
+        conn.commit()
+    finally:
+        conn.close()
 
 
 # ─── Transcription ───
 
 WHISPER_MAX_BYTES = 24 * 1024 * 1024  # 24MB (Whisper limit is 25MB)
-CHUNK_DURATION_MS = 10 * 60 * 1000    # 10 minutes per chunk
+WHISPER_CONCURRENCY = int(os.getenv("WHISPER_CONCURRENCY", 4))
 
 
 def _transcribe_file(path):
     """Send a single audio file to Whisper and return trimmed text."""
-    with open(path, "rb") as f:
-        result = openai_client.audio.transcriptions.create(
-            model="whisper-1", file=f, response_format="text",
-        )
+    def send():
+        with open(path, "rb") as f:
+            return get_openai().audio.transcriptions.create(
+                model="whisper-1", file=f, response_format="text",
+            )
+    result = whisper_retry.call(send, lane="bulk")
     return result.strip() if isinstance(result, str) else result.text.strip()
 
 
+def _transcribe_chunk(path):
+    """Transcribe one chunk.
+
+    Results are cached by the chunk's bytes, so a resumed job skips chunks
+    that already went through.
+    """
+    key = "audio:" + file_sha256(path)
+    cached = transcription_cache_get(key)
+    if cached is not None:
+        return cached
+    text = _transcribe_file(path)
+    transcription_cache_put(key, text)
+    return text
+
+
+def _transcribe_chunks(paths, progress=None):
+    """Transcribe chunks on a bounded thread pool, returning texts in chunk order.
+
+    If any chunk still fails after its retries, pending chunks are cancelled
+    and the error is raised so the whole job fails.
+    """
+    workers = max(1, min(WHISPER_CONCURRENCY, len(paths)))
+    done = []
+    lock = threading.Lock()
+
+    def report(_):
+        with lock:
+            done.append(1)
+            if progress:
+                progress("transcribing", len(done), len(paths))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_transcribe_chunk, p) for p in paths]
+        for future in futures:
+            future.add_done_callback(report)
+        texts = []
+        for i, future in enumerate(futures):
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise RuntimeError(f"chunk {i+1}/{len(paths)} failed: {e}") from e
+    return texts
+
+
+# Mono 16 kHz mp3 is plenty for speech. Profiles run from best to smallest;
+# the first whose estimated size fits in one Whisper request is used.
+ENCODING_PROFILES = [
+    ("speech-48k", "48k"),   # ~70 min per request
+    ("speech-32k", "32k"),   # ~105 min
+    ("speech-24k", "24k"),   # ~140 min
+    ("speech-16k", "16k"),   # ~3.5 h, beyond that the audio is chunked
+]
+SPEECH_ENCODE_ARGS = ["-ac", "1", "-ar", "16000", "-c:a", "libmp3lame"]
+
+
+SILENCE_THRESHOLD = os.getenv("SILENCE_THRESHOLD", "-35dB")
+SILENCE_MIN_GAP = float(os.getenv("SILENCE_MIN_GAP", 2.0))  # silences longer than this get compressed
+SILENCE_KEEP = 0.5                     # extra silence left in place of a compressed gap
+PAUSE_MIN = 0.3                        # shortest pause a chunk boundary may be placed in
+
+# Compress long silences while encoding; short pauses between words are untouched
+SILENCE_FILTER = (
+    f"silenceremove=stop_periods=-1:stop_duration={SILENCE_MIN_GAP}"
+    f":stop_threshold={SILENCE_THRESHOLD}:stop_silence={SILENCE_KEEP}"
+)
+
+
+RUSAGE_SCALE = 1024 if os.uname().sysname == "Darwin" else 1  # ru_maxrss: bytes on macOS, KB on Linux
+
+# Largest ffmpeg RSS (KB) seen by this thread since the last _start_rss_tracking
+ffmpeg_usage = threading.local()
+
+
+def _wait_ffmpeg(proc):
+    """Reap ffmpeg and return its peak RSS in KB.
+
+    The child's ru_maxrss from wait4 includes the high-water mark of the
+    Python process it was forked from, so on Linux ffmpeg's own VmHWM is
+    sampled from /proc while it runs; elsewhere wait4's figure is used.
+    """
+    hwm_kb, delay = None, 0.005
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        try:
+            with open(f"/proc/{proc.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        hwm_kb = max(hwm_kb or 0, int(line.split()[1]))
+        except OSError:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if hwm_kb is None and not os.path.exists("/proc/self/status"):
+        return usage.ru_maxrss // RUSAGE_SCALE
+    return hwm_kb or 0
+
+
+def _run_ffmpeg(args, loglevel="error"):
+    """Run ffmpeg and return (encoded duration in seconds, stderr).
+
+    ffmpeg streams from disk to disk, so memory stays flat no matter how
+    long the recording is.
+    """
+    cmd = [AudioSegment.converter, "-hide_banner", "-nostdin", "-v", loglevel, "-y",
+           "-progress", "pipe:1", "-nostats"] + args
+    # Output goes to temp files so the process can be reaped here with wait4
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=out, stderr=err)
+        peak_kb = _wait_ffmpeg(proc)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode(errors="replace")
+        stderr = err.read().decode(errors="replace")
+    ffmpeg_usage.peak_kb = max(getattr(ffmpeg_usage, "peak_kb", 0), peak_kb)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.strip()[-500:]}")
+    out_us = 0
+    for line in stdout.splitlines():
+        if line.startswith("out_time_us=") and line[12:].isdigit():
+            out_us = int(line[12:])
+    return out_us / 1_000_000, stderr
+
+
+def _parse_silences(stderr):
+    """Return [(start, end)] from silencedetect log lines."""
+    silences, start = [], None
+    for line in stderr.splitlines():
+        if "silence_start:" in line:
+            start = float(line.rsplit("silence_start:", 1)[1].split()[0])
+        elif "silence_end:" in line and start is not None:
+            end = float(line.rsplit("silence_end:", 1)[1].split()[0])
+            silences.append((start, end))
+            start = None
+    return silences
+
+
+def _pick_cut_points(pauses, duration, max_seconds):
+    """Choose split times so each chunk is at most max_seconds long.
+
+    Each cut goes in the middle of the last pause that still fits, so
+    words are not split. With no pause in range, it falls back to a hard cut.
+    """
+    mids = [(s + e) / 2 for s, e in pauses]
+    cuts, chunk_start = [], 0.0
+    while duration - chunk_start > max_seconds:
+        limit = chunk_start + max_seconds
+        in_range = [m for m in mids if chunk_start < m <= limit]
+        cut = in_range[-1] if in_range else limit
+        cuts.append(cut)
+        chunk_start = cut
+    return cuts
+
+
+def _choose_profile(seconds):
+    """Pick the best profile that fits the audio in a single Whisper request."""
+    for name, bitrate in ENCODING_PROFILES:
+        bytes_per_second = int(bitrate.rstrip("k")) * 1000 / 8
+        if seconds * bytes_per_second <= WHISPER_MAX_BYTES * 0.98:
+            return name, bitrate
+    return ENCODING_PROFILES[-1]
+
+
+def _preprocess_audio(src, out_dir):
+    """Convert an upload to a silence-compressed speech mp3 and split it at pauses.
+
+    A decode-only pass measures the trimmed duration so the encoding profile
+    can be chosen up front, then a single encode pass writes the mp3.
+    Returns (stats, paths). paths is the single mp3 when it fits under the
+    Whisper limit, otherwise chunks as large as the limit allows with each
+    boundary inside a pause.
+    """
+    t0 = time.time()
+    duration, stderr = _run_ffmpeg([
+        "-i", src, "-vn", "-map", "0:a",
+        "-af", f"silencedetect=n={SILENCE_THRESHOLD}:d={SILENCE_MIN_GAP},{SILENCE_FILTER}",
+        "-f", "null", "-",
+    ], loglevel="info")
+    removed = sum(max(0.0, e - s - SILENCE_MIN_GAP - SILENCE_KEEP) for s, e in _parse_silences(stderr))
+    profile, bitrate = _choose_profile(duration)
+
+    full = os.path.join(out_dir, "full.mp3")
+    duration, _ = _run_ffmpeg(["-i", src, "-vn", "-map", "0:a", "-af", SILENCE_FILTER]
+                              + SPEECH_ENCODE_ARGS + ["-b:a", bitrate, full])
+    size = os.path.getsize(full)
+    stats = {"input_s": duration + removed, "output_s": duration, "removed_s": removed, "bytes": size,
+             "profile": profile, "encode_ms": int((time.time() - t0) * 1000)}
+    if size <= WHISPER_MAX_BYTES or not duration:
+        return stats, [full]
+
+    # Find pauses in the trimmed audio and cut there with a stream copy (no re-encode)
+    _, stderr = _run_ffmpeg(["-i", full, "-af", f"silencedetect=n={SILENCE_THRESHOLD}:d={PAUSE_MIN}",
+                             "-f", "null", "-"], loglevel="info")
+    max_seconds = duration * WHISPER_MAX_BYTES / size * 0.98
+    cuts = _pick_cut_points(_parse_silences(stderr), duration, max_seconds)
+    _run_ffmpeg(["-i", full, "-map", "0:a", "-c", "copy", "-f", "segment",
+                 "-segment_times", ",".join(f"{c:.3f}" for c in cuts),
+                 os.path.join(out_dir, "chunk_%03d.mp3")])
+    chunks = sorted(os.path.join(out_dir, f) for f in os.listdir(out_dir) if f.startswith("chunk_"))
+    stats["encode_ms"] = int((time.time() - t0) * 1000)
+    return stats, chunks
+
+
+def _log_savings(stats, chunks):
+    saved_bytes = stats["bytes"] * stats["removed_s"] / stats["output_s"] if stats["output_s"] else 0
+    pct = 100 * stats["removed_s"] / stats["input_s"] if stats["input_s"] else 0
+    app.logger.info(
+        f"Audio: {stats['input_s']:.0f}s -> {stats['output_s']:.0f}s after silence trimming "
+        f"({stats['removed_s']:.0f}s, {pct:.0f}% fewer Whisper seconds), "
+        f"mp3={stats['bytes']/1024/1024:.1f}MB (~{saved_bytes/1024/1024:.1f}MB upload saved), chunks={chunks}, "
+        f"profile={stats['profile']} in {stats['encode_ms']}ms"
+    )
+
+
+def _current_rss_kb():
+    """Resident set size of this process right now, in KB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        # No /proc (macOS): the lifetime high-water mark is the best available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // RUSAGE_SCALE
+
+
+def _start_rss_tracking():
+    """Reset this thread's ffmpeg peak and return the worker's RSS at job start."""
+    ffmpeg_usage.peak_kb = 0
+    return _current_rss_kb()
+
+
+def _log_peak_rss(label, start_kb):
+    """Log the worker's RSS growth over this job and the largest ffmpeg run in it."""
+    now = _current_rss_kb()
+    app.logger.info(f"{label}: worker RSS {now/1024:.0f}MB ({(now - start_kb)/1024:+.0f}MB this job), "
+                    f"peak ffmpeg RSS {getattr(ffmpeg_usage, 'peak_kb', 0)/1024:.0f}MB")
+
+
+def transcribe_audio(src, upload_key, progress):
+    """Transcribe an upload on disk. Returns (text, encoding)."""
+    cached = transcription_cache_get(upload_key)
+    if cached is not None:
+        return cached, {"profile": "cached", "encode_ms": 0}
+
+    rss_start = _start_rss_tracking()
+    work_dir = tempfile.mkdtemp(prefix="transcribe-")
+    try:
+        if os.path.getsize(src) <= WHISPER_MAX_BYTES:
+            # Small enough already: send the original, no re-encode
+            encoding = {"profile": "passthrough", "encode_ms": 0}
+            paths = [src]
+            app.logger.info(f"Audio: {os.path.getsize(src)/1024/1024:.1f}MB, passthrough")
+        else:
+            progress("encoding")
+            stats, paths = _preprocess_audio(src, work_dir)
+            encoding = {"profile": stats["profile"], "encode_ms": stats["encode_ms"]}
+            _log_savings(stats, len(paths))
+
+        if len(paths) > 1:
+            app.logger.info(f"Split into {len(paths)} chunks, concurrency={WHISPER_CONCURRENCY}")
+        progress("transcribing", 0, len(paths))
+        transcripts = _transcribe_chunks(paths, progress)
+        text = " ".join(t for t in transcripts if t)
+        transcription_cache_put(upload_key, text)
+
+        _log_peak_rss(f"Transcribe ({encoding['profile']})", rss_start)
+        return text, encoding
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
 @app.route("/api/transcribe", methods=["POST"])
 def transcribe():
     if "audio" not in request.files:
         return jsonify({"error": "No audio file provided"}), 400
 
+    # Keep the upload where any worker can reach it; the job deletes it when done
     audio_file = request.files["audio"]
-    tmp_webm = None
-    tmp_files = []
+    job_dir = os.path.abspath(os.path.join(app.config["UPLOAD_FOLDER"], "jobs", str(uuid.uuid4())))
+    os.makedirs(job_dir)
+    ext = os.path.splitext(audio_file.filename or "")[1].lower() or ".webm"
+    src = os.path.join(job_dir, "upload" + ext)
+    audio_file.save(src)
+    upload_key = "upload:" + file_sha256(src)
+
+    db = get_db()
+    rec = create_recording(db, duration=request.form.get("duration", 0, type=int))
+
+    cached = transcription_cache_get(upload_key)
+    if cached is not None:
+        # Seen this exact upload before: no need to wait for a worker
+        app.logger.info(f"Transcribe: cache hit for {os.path.getsize(src)/1024/1024:.1f}MB upload")
+        shutil.rmtree(job_dir, ignore_errors=True)
+        encoding = {"profile": "cached", "encode_ms": 0}
+        update_recording(rec["id"], transcript=cached, encoding_profile="cached", encode_ms=0)
+        result = {"transcript": cached, "length": len(cached), "encoding": encoding}
+        job_id = enqueue_job("transcribe", {}, rec["id"], status="done", result=result)
+    else:
+        job_id = enqueue_job("transcribe", {"path": src, "dir": job_dir, "upload_key": upload_key,
+                                            "recording_id": rec["id"]}, rec["id"])
+    return jsonify({"job_id": job_id, **rec}), 202
+
+
+@job_handler("transcribe")
+def transcribe_job(payload, progress):
     try:
-        # Save uploaded webm
-        tmp_webm = tempfile.NamedTemporaryFile(suffix=".webm", delete=False)
-        audio_file.save(tmp_webm)
-        tmp_webm.close()
-
-        # Convert to mp3 (much smaller than webm)
-        audio = AudioSegment.from_file(tmp_webm.name, format="webm")
-        tmp_mp3 = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        tmp_mp3.close()
-        tmp_files.append(tmp_mp3.name)
-        audio.export(tmp_mp3.name, format="mp3", bitrate="64k")
-
-        mp3_size = os.path.getsize(tmp_mp3.name)
-        app.logger.info(f"Audio: {len(audio)/1000:.0f}s, mp3={mp3_size/1024/1024:.1f}MB")
-
-        if mp3_size <= WHISPER_MAX_BYTES:
-            text = _transcribe_file(tmp_mp3.name)
-        else:
-            # Split into ~10 minute chunks
-            chunk_paths = []
-            for i in range(0, len(audio), CHUNK_DURATION_MS):
-                chunk = audio[i:i + CHUNK_DURATION_MS]
-                cf = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-                cf.close()
-                tmp_files.append(cf.name)
-                chunk.export(cf.name, format="mp3", bitrate="64k")
-                chunk_paths.append(cf.name)
-
-            app.logger.info(f"Split into {len(chunk_paths)} chunks")
-            transcripts = [_transcribe_file(p) for p in chunk_paths]
-            text = " ".join(t for t in transcripts if t)
-
-        return jsonify({"transcript": text, "length": len(text)})
+        text, encoding = transcribe_audio(payload["path"], payload["upload_key"], progress)
+    except Exception as e:
+        shutil.rmtree(payload["dir"], ignore_errors=True)
+        raise JobError(f"Transcription failed: {e}") from e
+    update_recording(payload["recording_id"], transcript=text,
+                     encoding_profile=encoding["profile"], encode_ms=encoding["encode_ms"])
+    index_passages(payload["recording_id"], text)
+    shutil.rmtree(payload["dir"], ignore_errors=True)
+    return {"transcript": text, "length": len(text), "encoding": encoding}
+
+
+# ─── Live transcription (streaming ingest) ───
+#
+# While recording, the browser pushes MediaRecorder segments to a session.
+# The segments are appended to one WebM file on disk, and every closed
+# window of STREAM_WINDOW_SECONDS is transcribed in the background and
+# appended to the recording row. On stop, a stream_finish job transcribes
+# the tail window and stores the full transcript.
+
+STREAM_WINDOW_SECONDS = int(os.getenv("STREAM_WINDOW_SECONDS", 45))
+STREAM_WINDOW_SLACK = 2                # wait for this much audio past a window before cutting it
+STREAM_FINISH_TIMEOUT = 120            # seconds to wait for background windows on stop
+STREAM_PROFILE = ENCODING_PROFILES[0]  # windows are short, so always the best profile
+
+stream_executor = ThreadPoolExecutor(max_workers=WHISPER_CONCURRENCY)
+
+
+def _transcribe_window(session_id, idx):
+    """Cut one window out of the session's WebM, transcribe it, and store the text."""
+    conn = connect_db()
+    work_dir = tempfile.mkdtemp(prefix="stream-")
+    try:
+        row = conn.execute(
+            "SELECT w.start_s, w.end_s, s.path FROM stream_windows w "
+            "JOIN stream_sessions s ON s.id = w.session_id WHERE w.session_id = ? AND w.idx = ?",
+            (session_id, idx)
+        ).fetchone()
+        conn.execute("UPDATE stream_windows SET status = 'running' WHERE session_id = ? AND idx = ?",
+                     (session_id, idx))
+        conn.commit()
+
+        mp3 = os.path.join(work_dir, "window.mp3")
+        args = ["-ss", str(row["start_s"])]
+        if row["end_s"] is not None:
+            args += ["-t", str(row["end_s"] - row["start_s"])]
+        args += ["-i", row["path"]]
+        t0 = time.time()
+        seconds, _ = _run_ffmpeg(args + ["-vn", "-af", SILENCE_FILTER] + SPEECH_ENCODE_ARGS
+                                 + ["-b:a", STREAM_PROFILE[1], mp3])
+        encode_ms = int((time.time() - t0) * 1000)
+        text = _transcribe_chunk(mp3) if seconds >= 0.1 else ""
+
+        conn.execute("UPDATE stream_windows SET status = 'done', text = ?, error = '', encode_ms = ? "
+                     "WHERE session_id = ? AND idx = ?",
+                     (text, encode_ms, session_id, idx))
+        conn.commit()
+        _sync_stream_transcript(conn, session_id)
     except Exception as e:
-        app.logger.error(f"Transcription error: {traceback.format_exc()}")
-        return jsonify({"error": f"Transcription failed: {str(e)}"}), 500
+        app.logger.error(f"Stream window {session_id}/{idx} failed: {traceback.format_exc()}")
+        conn.execute("UPDATE stream_windows SET status = 'failed', error = ? WHERE session_id = ? AND idx = ?",
+                     (str(e), session_id, idx))
+        conn.commit()
     finally:
-        if tmp_webm:
-            try:
-                os.unlink(tmp_webm.name)
-            except OSError:
-                pass
-        for f in tmp_files:
-            try:
-                os.unlink(f)
-            except OSError:
-                pass
+        conn.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _sync_stream_transcript(conn, session_id):
+    """Write the text of all leading finished windows to the recording row.
+
+    Windows finish on different threads, so the prefix is read and written in
+    one write transaction: a thread that read an older, shorter prefix can't
+    overwrite the transcript after a newer one was stored.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT status, text FROM stream_windows WHERE session_id = ? ORDER BY idx", (session_id,)
+        ).fetchall()
+        texts = []
+        for r in rows:
+            if r["status"] != "done":
+                break
+            if r["text"]:
+                texts.append(r["text"])
+        rec_id = conn.execute("SELECT recording_id FROM stream_sessions WHERE id = ?", (session_id,)).fetchone()[0]
+        conn.execute("UPDATE recording_bodies SET transcript = ? WHERE recording_id = ?",
+                     (encode_text(" ".join(texts)), rec_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return " ".join(texts)
+
+
+def _schedule_window(db, session_id, start, end):
+    idx = db.execute("SELECT COUNT(*) FROM stream_windows WHERE session_id = ?", (session_id,)).fetchone()[0]
+    db.execute("INSERT INTO stream_windows (session_id, idx, start_s, end_s) VALUES (?, ?, ?, ?)",
+               (session_id, idx, start, end))
+    return idx
+
+
+@app.route("/api/stream/start", methods=["POST"])
+def stream_start():
+    session_id = str(uuid.uuid4())
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    path = os.path.abspath(os.path.join(app.config["UPLOAD_FOLDER"], f"stream-{session_id}.webm"))
+    open(path, "wb").close()
+
+    db = get_db()
+    rec = create_recording(db)
+    db.execute(
+        "INSERT INTO stream_sessions (id, recording_id, path, created_at) VALUES (?, ?, ?, ?)",
+        (session_id, rec["id"], path, rec["created_at"])
+    )
+    db.commit()
+    return jsonify({"session_id": session_id, **rec})
+
+
+@app.route("/api/stream/<session_id>/segment", methods=["POST"])
+def stream_segment(session_id):
+    data = request.get_data()
+    offset = request.args.get("offset", type=int)
+    elapsed = request.args.get("elapsed", 0, type=float)
+
+    db = get_db()
+    db.execute("BEGIN IMMEDIATE")
+    session = db.execute("SELECT * FROM stream_sessions WHERE id = ?", (session_id,)).fetchone()
+    if not session or session["closed"]:
+        db.rollback()
+        return jsonify({"error": "Stream session not found"}), 404
+    if offset is not None and offset != session["bytes_received"]:
+        db.rollback()
+        return jsonify({"error": "Out-of-order segment", "bytes_received": session["bytes_received"]}), 409
+
+    with open(session["path"], "ab") as f:
+        f.write(data)
+
+    window_start = session["window_start"]
+    scheduled = []
+    while elapsed - window_start >= STREAM_WINDOW_SECONDS + STREAM_WINDOW_SLACK:
+        end = window_start + STREAM_WINDOW_SECONDS
+        scheduled.append(_schedule_window(db, session_id, window_start, end))
+        window_start = end
+    db.execute("UPDATE stream_sessions SET bytes_received = ?, window_start = ? WHERE id = ?",
+               (session["bytes_received"] + len(data), window_start, session_id))
+    db.commit()
+
+    for idx in scheduled:
+        stream_executor.submit(_transcribe_window, session_id, idx)
+    return jsonify({"bytes_received": session["bytes_received"] + len(data), "windows": len(scheduled)})
+
+
+@app.route("/api/stream/<session_id>/finish", methods=["POST"])
+def stream_finish(session_id):
+    data = request.json or {}
+    duration = data.get("duration", 0)
+
+    db = get_db()
+    db.execute("BEGIN IMMEDIATE")
+    session = db.execute("SELECT * FROM stream_sessions WHERE id = ?", (session_id,)).fetchone()
+    if not session or session["closed"]:
+        db.rollback()
+        return jsonify({"error": "Stream session not found"}), 404
+    tail = None
+    if session["bytes_received"]:
+        tail = _schedule_window(db, session_id, session["window_start"], None)
+    db.execute("UPDATE stream_sessions SET closed = 1 WHERE id = ?", (session_id,))
+    db.commit()
+
+    job_id = enqueue_job("stream_finish", {"session_id": session_id, "tail": tail, "duration": duration},
+                         session["recording_id"])
+    return jsonify({"job_id": job_id, "id": session["recording_id"]}), 202
+
+
+@job_handler("stream_finish")
+def stream_finish_job(payload, progress):
+    """Transcribe the tail window, wait for the background ones, and store the transcript."""
+    session_id = payload["session_id"]
+    conn = connect_db()
+    try:
+        session = conn.execute("SELECT * FROM stream_sessions WHERE id = ?", (session_id,)).fetchone()
+        if payload["tail"] is not None:
+            progress("transcribing tail")
+            _transcribe_window(session_id, payload["tail"])
+
+        deadline = time.time() + STREAM_FINISH_TIMEOUT
+        while time.time() < deadline:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM stream_windows WHERE session_id = ? AND status IN ('queued', 'running')",
+                (session_id,)
+            ).fetchone()[0]
+            if not pending:
+                break
+            progress("waiting for windows", 0, pending)
+            time.sleep(0.5)
+
+        # Redo windows that failed or never started. A window still running
+        # belongs to the background executor; running it again here would
+        # call Whisper twice and race its writes.
+        leftovers = conn.execute(
+            "SELECT idx FROM stream_windows WHERE session_id = ? AND status IN ('failed', 'queued') ORDER BY idx",
+            (session_id,)
+        ).fetchall()
+        for i, r in enumerate(leftovers):
+            progress("retrying windows", i, len(leftovers))
+            _transcribe_window(session_id, r["idx"])
+        unfinished = conn.execute(
+            "SELECT idx, status, error FROM stream_windows WHERE session_id = ? AND status != 'done' ORDER BY idx",
+            (session_id,)
+        ).fetchone()
+        if unfinished:
+            reason = unfinished["error"] or f"still {unfinished['status']}"
+            raise JobError(f"Transcription failed: window {unfinished['idx']+1}: {reason}")
+
+        text = _sync_stream_transcript(conn, session_id)
+        encode_ms = conn.execute("SELECT COALESCE(SUM(encode_ms), 0) FROM stream_windows WHERE session_id = ?",
+                                 (session_id,)).fetchone()[0]
+        conn.execute("UPDATE recordings SET duration = ?, encoding_profile = ?, encode_ms = ? WHERE id = ?",
+                     (payload["duration"], f"stream-{STREAM_PROFILE[0]}", encode_ms, session["recording_id"]))
+        conn.commit()
+    finally:
+        conn.close()
+    app.logger.info(f"Stream {session_id}: {len(text)} chars, tail window only on stop")
+    try:
+        os.unlink(session["path"])
+    except OSError:
+        pass
+    index_passages(session["recording_id"], text)
+    return {"transcript": text, "length": len(text), "id": session["recording_id"]}
 
 
 # ─── Routes ───
@@ -216,48 +2443,90 @@ def index():
 
 @app.route("/api/save_recording", methods=["POST"])
 def save_recording():
-    global active_recording_id
     data = request.json
-    rec_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat() + "Z"
-    db = get_db()
-    db.execute(
-        "INSERT INTO recordings (id, name, transcript, created_at, duration) VALUES (?, ?, ?, ?, ?)",
-        (rec_id, "Untitled Recording", data.get("transcript", ""), now, data.get("duration", 0))
-    )
-    db.commit()
-    active_recording_id = rec_id
-    return jsonify({"id": rec_id, "name": "Untitled Recording", "created_at": now})
+    rec = create_recording(get_db(), data.get("transcript", ""), data.get("duration", 0), data.get("encoding"))
+    index_passages(rec["id"], data.get("transcript", ""))
+    return jsonify(rec)
+
+
+RECORDINGS_PAGE_SIZE = 50
+RECORDINGS_PAGE_MAX = 200
 
 
 @app.route("/api/recordings", methods=["GET"])
 def list_recordings():
+    """Newest-first page of recordings, or with ?since=N only what changed after version N.
+
+    Pages are keyed by (created_at, id): pass the returned next_cursor to get
+    the following page. Responses carry an ETag of the list version, so an
+    unchanged list is answered with 304 before touching the rows.
+    """
     db = get_db()
-    rows = db.execute(
-        "SELECT id, name, created_at, duration FROM recordings ORDER BY created_at DESC"
-    ).fetchall()
-    return jsonify([dict(r) for r in rows])
+    version = current_list_version(db)
+    etag = f"recordings-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    since = request.args.get("since", type=int)
+    if since is not None:
+        changed = db.execute(
+            "SELECT id, name, created_at, duration FROM recordings WHERE version > ? "
+            "ORDER BY created_at DESC, id DESC", (since,)
+        ).fetchall()
+        deleted = db.execute("SELECT id FROM recording_tombstones WHERE version > ?", (since,)).fetchall()
+        result = {"version": version, "changed": [dict(r) for r in changed], "deleted": [r["id"] for r in deleted]}
+    else:
+        limit = max(1, min(request.args.get("limit", RECORDINGS_PAGE_SIZE, type=int), RECORDINGS_PAGE_MAX))
+        cursor = request.args.get("cursor", "")
+        if cursor:
+            created_at, _, last_id = cursor.partition("|")
+            rows = db.execute(
+                "SELECT id, name, created_at, duration FROM recordings WHERE (created_at, id) < (?, ?) "
+                "ORDER BY created_at DESC, id DESC LIMIT ?", (created_at, last_id, limit + 1)
+            ).fetchall()
+        else:
+            rows = db.execute(
+                "SELECT id, name, created_at, duration FROM recordings "
+                "ORDER BY created_at DESC, id DESC LIMIT ?", (limit + 1,)
+            ).fetchall()
+        page = [dict(r) for r in rows[:limit]]
+        next_cursor = f"{page[-1]['created_at']}|{page[-1]['id']}" if len(rows) > limit else None
+        result = {"version": version, "recordings": page, "next_cursor": next_cursor}
+
+    response = jsonify(result)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.route("/api/recording/<rec_id>", methods=["GET"])
 def get_recording(rec_id):
-    global active_recording_id
     db = get_db()
-    row = db.execute("SELECT * FROM recordings WHERE id = ?", (rec_id,)).fetchone()
+    row = db.execute(
+        "SELECT r.*, b.transcript, b.summary, b.email, b.notes FROM recordings r "
+        "LEFT JOIN recording_bodies b ON b.recording_id = r.id WHERE r.id = ?", (rec_id,)
+    ).fetchone()
     if not row:
         return jsonify({"error": "Recording not found"}), 404
-    active_recording_id = rec_id
-    return jsonify(dict(row))
+    result = dict(row)
+    for field in RECORDING_BODY_FIELDS:
+        result[field] = decode_text(result[field])
+    analysis = load_artifact(db, rec_id, "analysis", result["transcript"] or "")
+    result["analysis"] = json_mod.loads(analysis) if analysis else None
+    return jsonify(result)
 
 
 @app.route("/api/recording/<rec_id>", methods=["DELETE"])
 def delete_recording(rec_id):
-    global active_recording_id
     db = get_db()
     db.execute("DELETE FROM recordings WHERE id = ?", (rec_id,))
+    db.execute("DELETE FROM recording_bodies WHERE recording_id = ?", (rec_id,))
+    db.execute("DELETE FROM artifacts WHERE recording_id = ?", (rec_id,))
+    db.execute("DELETE FROM chat_messages WHERE recording_id = ?", (rec_id,))
+    db.execute("DELETE FROM passage_texts WHERE recording_id = ?", (rec_id,))
     db.commit()
-    if active_recording_id == rec_id:
-        active_recording_id = None
     return jsonify({"ok": True})
 
 
@@ -265,25 +2534,38 @@ def delete_recording(rec_id):
 def generate_name():
     data = request.json
     rec_id = data.get("id")
-    text = data.get("transcript", "")[:2000]
-    if not rec_id or not text:
+    transcript = data.get("transcript", "")
+    if rec_id and not transcript:
+        transcript = (recording_texts(rec_id) or ("", ""))[0]
+    if not rec_id or not transcript:
         return jsonify({"error": "id and transcript required"}), 400
 
     try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=60,
-            messages=[{"role": "user", "content": f"Generate a short descriptive name (max 30 characters) for this meeting recording based on the transcript. Return ONLY the name, nothing else. No quotes.\n\nTranscript:\n{text}"}],
-        ))
-        name = msg.content[0].text.strip()[:30]
-        db = get_db()
-        db.execute("UPDATE recordings SET name = ? WHERE id = ?", (name, rec_id))
-        db.commit()
-        return jsonify({"name": name})
+        return jsonify({"name": name_recording(rec_id, transcript)})
     except Exception as e:
         return handle_api_error(e)
 
 
+def name_recording(rec_id, transcript):
+    """Generate and store a name, unless one was already generated from this transcript."""
+    conn = connect_db()
+    try:
+        if load_artifact(conn, rec_id, "name", transcript) is not None:
+            # Keep any rename the user made since
+            row = conn.execute("SELECT name FROM recordings WHERE id = ?", (rec_id,)).fetchone()
+            return row["name"] if row else ""
+    finally:
+        conn.close()
+
+    name = ask_claude({
+        "max_tokens": 60,
+        "messages": [{"role": "user", "content": f"Generate a short descriptive name (max 30 characters) for this meeting recording based on the transcript. Return ONLY the name, nothing else. No quotes.\n\nTranscript:\n{transcript[:2000]}"}],
+    }, cache=True).strip()[:30]
+    update_recording(rec_id, name=name)
+    save_artifact(rec_id, "name", transcript, name)
+    return name
+
+
 @app.route("/api/rename_recording", methods=["POST"])
 def rename_recording():
     data = request.json
@@ -292,9 +2574,7 @@ def rename_recording():
     if not rec_id or not new_name:
         return jsonify({"error": "id and name required"}), 400
     new_name = new_name[:60]
-    db = get_db()
-    db.execute("UPDATE recordings SET name = ? WHERE id = ?", (new_name, rec_id))
-    db.commit()
+    update_recording(rec_id, name=new_name)
     return jsonify({"ok": True, "name": new_name})
 
 
@@ -302,7 +2582,8 @@ def rename_recording():
 
 @app.route("/api/analyze", methods=["POST"])
 def analyze():
-    transcript = request.json.get("transcript", "")[:4000]
+    rec_id = request.json.get("recording_id")
+    transcript, _ = request_texts()
     defaults = {
         "meeting_type": "sales",
         "email_default": "customer",
@@ -313,10 +2594,26 @@ def analyze():
         return jsonify(defaults)
 
     try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=400,
-            messages=[{"role": "user", "content": f"""Analyze this meeting transcript. Return ONLY valid JSON, no other text.
+        return jsonify(analyze_transcript(transcript, rec_id))
+    except Exception:
+        return jsonify(defaults)
+
+
+def analyze_transcript(full_transcript, rec_id=None):
+    """Meeting type, email default, suggested questions and alerts, stored per recording."""
+    if rec_id:
+        conn = connect_db()
+        try:
+            stored = load_artifact(conn, rec_id, "analysis", full_transcript)
+        finally:
+            conn.close()
+        if stored:
+            return json_mod.loads(stored)
+
+    transcript = full_transcript[:4000]
+    text = ask_claude({
+        "max_tokens": 400,
+        "messages": [{"role": "user", "content": f"""Analyze this meeting transcript. Return ONLY valid JSON, no other text.
 
 {{
   "meeting_type": "sales | internal | learning | one_on_one",
@@ -342,21 +2639,126 @@ Rules:
 
 Transcript:
 {transcript}"""}],
-        ))
-        result = json_mod.loads(msg.content[0].text)
-        return jsonify(result)
-    except Exception:
-        return jsonify(defaults)
+    }, cache=True, check=json_mod.loads)
+    if rec_id:
+        save_artifact(rec_id, "analysis", full_transcript, text)
+    return json_mod.loads(text)
 
 
 # ─── Summarize ───
 
 @app.route("/api/summarize", methods=["POST"])
 def summarize():
-    transcript = request.json.get("transcript", "")
+    transcript, _ = request_texts()
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+
+    rec_id = request.json.get("recording_id")
+    # A saved recording is loaded by the worker; only unsaved text travels in the payload
+    payload = {"recording_id": rec_id}
+    if not rec_id:
+        payload["transcript"] = transcript
+    job_id = enqueue_job("summarize", payload, rec_id)
+    return jsonify({"job_id": job_id}), 202
+
+
+@app.route("/api/summarize/stream", methods=["POST"])
+def summarize_stream():
+    transcript, _ = request_texts()
     if not transcript:
         return jsonify({"error": "No transcript provided"}), 400
+    return stream_claude(lambda progress: summary_request(transcript, progress),
+                         "summary", on_complete=recording_writer("summary"), cache=True)
+
 
+@job_handler("summarize")
+def summarize_job(payload, progress):
+    transcript = payload.get("transcript")
+    if transcript is None:
+        transcript = (recording_texts(payload["recording_id"]) or ("", ""))[0]
+    if not transcript:
+        raise JobError("No transcript provided")
+    summary = summarize_transcript(transcript, progress)
+    if payload.get("recording_id"):
+        update_recording(payload["recording_id"], summary=summary)
+    return {"summary": summary}
+
+
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", 4))
+SUMMARY_MERGE_BUDGET = int(os.getenv("SUMMARY_MERGE_BUDGET", 100_000))  # chars of partials per merge prompt
+
+
+def _parallel_map(fn, items, on_done=None):
+    """Run fn(i, item) for every item on a bounded pool, keeping input order."""
+    done = []
+    lock = threading.Lock()
+
+    def report(_):
+        with lock:
+            done.append(1)
+            if on_done:
+                on_done(len(done))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_MAP_CONCURRENCY, len(items)))) as pool:
+        futures = [pool.submit(run_in_lane, "bulk", fn, i, item) for i, item in enumerate(items)]
+        for future in futures:
+            future.add_done_callback(report)
+        return [f.result() for f in futures]
+
+
+def _merged_size(partials):
+    return sum(len(p) + 16 for p in partials)
+
+
+def _reduce_partials(partials, progress):
+    """Combine partial extracts in a tree until they fit one merge prompt.
+
+    Consecutive partials are grouped up to SUMMARY_MERGE_BUDGET chars, and
+    each group is condensed into one extract concurrently. Depth grows with
+    the log of the number of chunks, not linearly.
+    """
+    level = 0
+    while len(partials) > 1 and _merged_size(partials) > SUMMARY_MERGE_BUDGET:
+        level += 1
+        groups, current = [], []
+        for part in partials:
+            if current and _merged_size(current + [part]) > SUMMARY_MERGE_BUDGET:
+                groups.append(current)
+                current = []
+            current.append(part)
+        groups.append(current)
+        if len(groups) == len(partials):
+            # Every partial is over budget on its own; pair them so the tree still shrinks
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+
+        def combine(_, group):
+            if len(group) == 1:
+                return group[0]
+            merged = "\n---\n".join(group)
+            return ask_claude({
+                "max_tokens": 2048,
+                "messages": [{"role": "user", "content": f"""Combine these extracts from consecutive parts of one meeting transcript into a single extract.
+
+Keep the same structure: who was in the meeting, key insights or decisions, action items with owners and deadlines, what Henry committed to do, deadlines or next meeting dates, and what happens next.
+
+Deduplicate, but keep every specific name, number and date. No filler.
+
+Extracts:
+{merged}"""}],
+            }, cache=True)
+
+        app.logger.info(f"Summarize: reduce level {level}, {len(partials)} partials -> {len(groups)}")
+        partials = _parallel_map(combine, groups,
+                                 lambda done, n=len(groups), lv=level: progress(f"merging (level {lv})", done, n))
+    return partials
+
+
+def summarize_transcript(transcript, progress):
+    return ask_claude(summary_request(transcript, progress), cache=True)
+
+
+def summary_request(transcript, progress):
+    """Run any map/reduce work and return the kwargs for the final summary call."""
     app.logger.info(f"Summarize: {len(transcript)} chars")
 
     prompt = f"""Generate a meeting summary that tells the story of what happened.
@@ -424,20 +2826,15 @@ CLARITY OVER BREVITY:
 Transcript:
 {transcript}"""
 
-    try:
-        client = get_claude()
-        chunks = chunk_transcript(transcript)
-
-        if len(chunks) == 1:
-            msg = call_claude(lambda: client.messages.create(
-                model="claude-sonnet-4-5-20250929", max_tokens=2048,
-                messages=[{"role": "user", "content": prompt}],
-            ))
-            summary = msg.content[0].text
-        else:
-            partials = []
-            for i, chunk in enumerate(chunks):
-                chunk_prompt = f"""Extract key information from part {i+1}/{len(chunks)} of a meeting transcript.
+    spans = list(iter_chunk_spans(transcript))
+
+    if len(spans) <= 1:
+        progress("summarizing")
+        return {"max_tokens": 2048, "messages": [{"role": "user", "content": prompt}]}
+    else:
+        def extract(i, span):
+            chunk = transcript[span[0]:span[1]]
+            chunk_prompt = f"""Extract key information from part {i+1}/{len(spans)} of a meeting transcript.
 
 For this segment, identify:
 - Who was in the meeting (names, roles, companies)
@@ -451,16 +2848,16 @@ Be specific — use exact names, numbers, dates. No filler.
 
 Transcript segment:
 {chunk}"""
-                msg = call_claude(lambda p=chunk_prompt: client.messages.create(
-                    model="claude-sonnet-4-5-20250929", max_tokens=1024,
-                    messages=[{"role": "user", "content": p}],
-                ))
-                partials.append(msg.content[0].text)
+            return ask_claude({"max_tokens": 1024, "messages": [{"role": "user", "content": chunk_prompt}]},
+                              cache=True)
+
+        partials = _parallel_map(extract, spans,
+                                 lambda done: progress("summarizing", done, len(spans)))
+        partials = _reduce_partials(partials, progress)
 
-            merged = "\n---\n".join([f"Part {i+1}:\n{s}" for i, s in enumerate(partials)])
-            msg = call_claude(lambda: client.messages.create(
-                model="claude-sonnet-4-5-20250929", max_tokens=2048,
-                messages=[{"role": "user", "content": f"""Merge these partial meeting extracts into one summary that tells the story of what happened.
+        progress("merging")
+        merged = "\n---\n".join([f"Part {i+1}:\n{s}" for i, s in enumerate(partials)])
+        return {"max_tokens": 2048, "messages": [{"role": "user", "content": f"""Merge these partial meeting extracts into one summary that tells the story of what happened.
 
 FORMAT:
 
@@ -491,26 +2888,12 @@ Rules:
 - Prioritize clarity over brevity — someone not in the meeting should understand what happened
 
 Partial extracts:
-{merged}"""}],
-            ))
-            summary = msg.content[0].text
-
-        update_active_recording("summary", summary)
-        return jsonify({"summary": summary})
-    except Exception as e:
-        return handle_api_error(e)
+{merged}"""}]}
 
 
-@app.route("/api/email", methods=["POST"])
-def generate_email():
-    transcript = request.json.get("transcript", "")
-    summary = request.json.get("summary", "")
-    email_type = request.json.get("email_type", "customer")
-    if not transcript:
-        return jsonify({"error": "No transcript provided"}), 400
-
+def email_prompt(transcript, summary, email_type):
     if email_type == "team_update":
-        prompt = f"""Write an INTERNAL team update email summarizing this customer call. NOT sent to the customer — sent to your internal team.
+        return f"""Write an INTERNAL team update email summarizing this customer call. NOT sent to the customer — sent to your internal team.
 
 EXACT FORMAT:
 
@@ -548,20 +2931,8 @@ Meeting summary:
 Meeting transcript:
 {transcript[:100000]}"""
 
-        try:
-            client = get_claude()
-            msg = call_claude(lambda: client.messages.create(
-                model="claude-sonnet-4-5-20250929", max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}],
-            ))
-            email_text = msg.content[0].text
-            update_active_recording("email", email_text)
-            return jsonify({"email": email_text})
-        except Exception as e:
-            return handle_api_error(e)
-
     if email_type == "sales_followup":
-        prompt = f"""You are a top-performing enterprise sales rep writing a brief follow-up email based on the meeting transcript. Analyze the transcript and pick ONE of these 3 styles:
+        return f"""You are a top-performing enterprise sales rep writing a brief follow-up email based on the meeting transcript. Analyze the transcript and pick ONE of these 3 styles:
 
 STYLE 1 - CASUAL (use when: next meeting already scheduled, no urgent actions, early stage/discovery):
 Subject: Good connecting
@@ -607,19 +2978,7 @@ Meeting summary:
 Meeting transcript:
 {transcript[:200000]}"""
 
-        try:
-            client = get_claude()
-            msg = call_claude(lambda: client.messages.create(
-                model="claude-sonnet-4-5-20250929", max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}],
-            ))
-            email_text = msg.content[0].text
-            update_active_recording("email", email_text)
-            return jsonify({"email": email_text})
-        except Exception as e:
-            return handle_api_error(e)
-
-    prompt = f"""You are a top-performing enterprise sales rep writing a brief follow-up email. Your style is confident, peer-to-peer, and action-oriented. You never sound desperate or overly formal. You sound like a colleague, not a vendor.
+    return f"""You are a top-performing enterprise sales rep writing a brief follow-up email. Your style is confident, peer-to-peer, and action-oriented. You never sound desperate or overly formal. You sound like a colleague, not a vendor.
 
 STEP 1 — CHOOSE THE RIGHT STYLE:
 
@@ -756,29 +3115,22 @@ Meeting summary:
 Meeting transcript:
 {transcript[:200000]}"""
 
-    try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}],
-        ))
-        email = msg.content[0].text
-        update_active_recording("email", email)
-        return jsonify({"email": email})
-    except Exception as e:
-        return handle_api_error(e)
 
 
-@app.route("/api/email/regenerate", methods=["POST"])
-def regenerate_email():
-    transcript = request.json.get("transcript", "")
-    summary = request.json.get("summary", "")
-    current_email = request.json.get("current_email", "")
-    style = request.json.get("style", "shorter")
-
+@app.route("/api/email", methods=["POST"])
+@app.route("/api/email/stream", methods=["POST"], endpoint="generate_email_stream")
+def generate_email():
+    transcript, summary = request_texts()
+    email_type = request.json.get("email_type", "customer")
     if not transcript:
         return jsonify({"error": "No transcript provided"}), 400
 
+    prompt = email_prompt(transcript, summary, email_type)
+    return complete_or_stream({"max_tokens": 1024, "messages": [{"role": "user", "content": prompt}]},
+                              "email", on_complete=recording_writer("email"))
+
+
+def regenerate_prompt(transcript, summary, current_email, style):
     base_rules = """UNIVERSAL RULES:
 - Always sign as "Henry"
 - Greeting punctuation: casual uses "Hey [Name] -" (dash), informational uses "Hi [Name]." (period), action uses "Hi [Name] -" (dash). Never comma.
@@ -1006,20 +3358,26 @@ Current email (write something DIFFERENT):
 Current email:
 {current_email}"""
 
-    try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=1024,
-            messages=[{"role": "user", "content": instruction}],
-        ))
-        email = msg.content[0].text
-        update_active_recording("email", email)
-        return jsonify({"email": email})
-    except Exception as e:
-        return handle_api_error(e)
+    return instruction
+
+
+@app.route("/api/email/regenerate", methods=["POST"])
+@app.route("/api/email/regenerate/stream", methods=["POST"], endpoint="regenerate_email_stream")
+def regenerate_email():
+    transcript, summary = request_texts()
+    current_email = request.json.get("current_email", "")
+    style = request.json.get("style", "shorter")
+
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+
+    instruction = regenerate_prompt(transcript, summary, current_email, style)
+    return complete_or_stream({"max_tokens": 1024, "messages": [{"role": "user", "content": instruction}]},
+                              "email", on_complete=recording_writer("email"))
 
 
 @app.route("/api/email/quick-edit", methods=["POST"])
+@app.route("/api/email/quick-edit/stream", methods=["POST"], endpoint="quick_edit_email_stream")
 def quick_edit_email():
     current_email = request.json.get("current_email", "")
     edit_instruction = request.json.get("instruction", "")
@@ -1036,30 +3394,249 @@ Edit instruction: {edit_instruction}
 Current email:
 {current_email}"""
 
+    return complete_or_stream({"max_tokens": 1024, "messages": [{"role": "user", "content": prompt}]},
+                              "email", on_complete=recording_writer("email"))
+
+
+# ─── Post-recording pipeline ───
+#
+# Once a recording has a transcript, naming, analysis and the summary are
+# independent Claude calls. One job runs them concurrently, persists each as
+# it finishes and publishes it in the job's partial result, so the browser
+# shows the name and pills while the summary is still being written.
+
+@app.route("/api/pipeline", methods=["POST"])
+def pipeline():
+    rec_id = request.json.get("recording_id")
+    transcript, _ = request_texts()
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+
+    if not rec_id:
+        rec_id = create_recording(get_db(), transcript, request.json.get("duration", 0))["id"]
+        index_passages(rec_id, transcript)
+    job_id = enqueue_job("pipeline", {"recording_id": rec_id}, rec_id)
+    return jsonify({"job_id": job_id, "recording_id": rec_id}), 202
+
+
+@job_handler("pipeline")
+def pipeline_job(payload, progress):
+    rec_id = payload["recording_id"]
+    transcript = (recording_texts(rec_id) or ("", ""))[0]
+    if not transcript:
+        raise JobError("No transcript provided")
+
+    def summarize_step():
+        summary = summarize_transcript(transcript, lambda *args: None)
+        update_recording(rec_id, summary=summary)
+        return summary
+
+    steps = {
+        "name": lambda: name_recording(rec_id, transcript),
+        "analysis": lambda: analyze_transcript(transcript, rec_id),
+        "summary": summarize_step,
+    }
+    result, errors = {}, {}
+    progress("running", 0, len(steps))
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        futures = {pool.submit(run_in_lane, "bulk", fn): step for step, fn in steps.items()}
+        for future in as_completed(futures):
+            step = futures[future]
+            try:
+                result[step] = future.result()
+            except Exception as e:
+                app.logger.error(f"Pipeline {rec_id}: {step} failed: {e}")
+                errors[step] = api_error_message(e)[0]
+            progress("running", len(result) + len(errors), len(steps), result=dict(result, errors=errors))
+
+    if not result:
+        raise JobError(next(iter(errors.values())))
+    return dict(result, errors=errors)
+
+
+# ─── Passage index ───
+#
+# Each transcript is split into passages of about PASSAGE_TOKENS, stored
+# compressed in passage_texts and indexed in the FTS5 passages table when it
+# is saved. Chat on a long meeting sends
+# the passages that rank highest (BM25) for the question instead of the
+# whole transcript, so prompt size stays flat as meetings get longer.
+
+PASSAGE_TOKENS = 300
+STOP_WORDS = frozenset("""
+a about all also an and any are as at be but by can did do does for from had has have how i if in is it
+its me my of on or our so that the their them then there they this to was we were what when where which
+who why will with would you your
+""".split())
+
+
+def index_passages(rec_id, transcript):
+    texts = [transcript[a:b].strip() for a, b in iter_chunk_spans(transcript, PASSAGE_TOKENS, 0)]
+    conn = connect_db()
     try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}],
-        ))
-        email = msg.content[0].text
-        update_active_recording("email", email)
-        return jsonify({"email": email})
-    except Exception as e:
-        return handle_api_error(e)
+        conn.execute("DELETE FROM passage_texts WHERE recording_id = ?", (rec_id,))
+        conn.executemany(
+            "INSERT INTO passage_texts (recording_id, idx, text) VALUES (?, ?, ?)",
+            [(rec_id, i, encode_text(text)) for i, text in enumerate(texts)]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    save_artifact(rec_id, "passages", transcript, "")
+
+
+def ensure_passage_index(db, rec_id, transcript):
+    if load_artifact(db, rec_id, "passages", transcript) is None:
+        index_passages(rec_id, transcript)
+
+
+def retrieve_passages(rec_id, query, budget_chars):
+    """Best-matching passages for query that fit budget_chars, in transcript order."""
+    terms = [t for t in re.findall(r"[a-z0-9]+", query.lower()) if len(t) > 1 and t not in STOP_WORDS]
+    if not terms:
+        return []
+    match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+    conn = connect_db()
+    try:
+        # A recording's passages are written in one transaction, so their ids
+        # form one range; matching inside it skips every other recording
+        span = conn.execute("SELECT MIN(id), MAX(id) FROM passage_texts WHERE recording_id = ?",
+                            (rec_id,)).fetchone()
+        if span[0] is None:
+            return []
+        ranked = [r[0] for r in conn.execute(
+            "SELECT rowid FROM passages WHERE passages MATCH ? AND rowid BETWEEN ? AND ? "
+            "ORDER BY bm25(passages) LIMIT 100",
+            (match, span[0], span[1])
+        )]
+        stored = {r["id"]: r for r in conn.execute(
+            f"SELECT id, idx, text FROM passage_texts WHERE recording_id = ? AND id IN ({', '.join('?' * len(ranked))})",
+            (rec_id, *ranked)
+        )}
+    finally:
+        conn.close()
+    picked, used = [], 0
+    for pid in ranked:
+        if pid not in stored:
+            continue
+        text = decode_text(stored[pid]["text"])
+        if used + len(text) > budget_chars:
+            continue
+        picked.append((stored[pid]["idx"], text))
+        used += len(text)
+    return [text for _, text in sorted(picked)]
+
+
+# ─── Search ───
+#
+# /api/search ranks recordings with BM25 over the recording_search index,
+# weighting the name above the summary and email, and those above the
+# transcript. Every query term must match; the last one also matches as a
+# prefix so results update while typing. Snippets mark hits with \x02/\x03,
+# which the client swaps for <mark> after escaping the text.
+
+SEARCH_RESULTS = 20
+SEARCH_SNIPPET_TOKENS = 16
+SEARCH_WEIGHTS = (8.0, 1.0, 3.0, 2.0)     # name, transcript, summary, email
+
+
+def search_match(query):
+    """FTS5 MATCH expression for a free-text query, or None if it has no terms."""
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return None
+    return " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+@app.route("/api/search", methods=["GET"])
+def search_recordings():
+    match = search_match(request.args.get("q", ""))
+    if match is None:
+        return jsonify({"results": []})
+    limit = max(1, min(request.args.get("limit", SEARCH_RESULTS, type=int), 100))
+    t0 = time.time()
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    rows = get_db().execute(
+        f"SELECT r.id, r.name, r.created_at, r.duration, "
+        f"snippet(recording_search, -1, char(2), char(3), '…', {SEARCH_SNIPPET_TOKENS}) AS snippet "
+        f"FROM recording_search JOIN recording_bodies b ON b.id = recording_search.rowid "
+        f"JOIN recordings r ON r.id = b.recording_id "
+        f"WHERE recording_search MATCH ? ORDER BY bm25(recording_search, {weights}) LIMIT ?",
+        (match, limit)
+    ).fetchall()
+    return jsonify({"results": [dict(r) for r in rows], "took_ms": round((time.time() - t0) * 1000, 1)})
+
+
+# ─── Chat ───
+#
+# Conversations on saved recordings live in chat_messages, so each turn only
+# sends the new question; the server replays the last CHAT_HISTORY_MESSAGES.
+# Transcripts over CHAT_CONTEXT_TOKENS are answered from retrieved passages
+# unless the request asks for mode "full".
+
+CHAT_HISTORY_MESSAGES = 20
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 12000))
+
+
+def load_chat_history(rec_id):
+    conn = connect_db()
+    try:
+        rows = conn.execute(
+            "SELECT role, content FROM chat_messages WHERE recording_id = ? ORDER BY id DESC LIMIT ?",
+            (rec_id, CHAT_HISTORY_MESSAGES)
+        ).fetchall()
+    finally:
+        conn.close()
+    history = [{"role": r["role"], "content": r["content"]} for r in reversed(rows)]
+    # The window may open on an assistant reply; the API wants a user turn first
+    while history and history[0]["role"] != "user":
+        history.pop(0)
+    return history
+
+
+def save_chat_turn(rec_id, question, answer):
+    conn = connect_db()
+    try:
+        now = _now()
+        conn.executemany(
+            "INSERT INTO chat_messages (recording_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+            [(rec_id, "user", question, now), (rec_id, "assistant", answer, now)]
+        )
+        conn.commit()
+    finally:
+        conn.close()
 
 
 @app.route("/api/chat", methods=["POST"])
+@app.route("/api/chat/stream", methods=["POST"], endpoint="chat_stream")
 def chat():
     question = request.json.get("question", "")
-    transcript = request.json.get("transcript", "")
-    chat_history = request.json.get("history", [])
-    summary = request.json.get("summary", "")
+    rec_id = request.json.get("recording_id")
+    transcript, summary = request_texts()
 
     if not question:
         return jsonify({"error": "No question provided"}), 400
 
-    system_prompt = f"""You are a senior sales strategist and deal desk analyst embedded in the user's workflow. You've closed 8-figure deals and coached hundreds of AEs. You think in terms of deal mechanics, not just information retrieval.
+    if rec_id:
+        chat_history = load_chat_history(rec_id)
+    else:
+        chat_history = request.json.get("history", [])[-CHAT_HISTORY_MESSAGES:]
+
+    context_heading, context, cacheable = "Meeting Transcript:", transcript[:CHUNK_TOKENS * CHARS_PER_TOKEN], True
+    budget = CHAT_CONTEXT_TOKENS * CHARS_PER_TOKEN
+    if rec_id and request.json.get("mode") != "full" and len(transcript) > budget:
+        ensure_passage_index(get_db(), rec_id, transcript)
+        # Include the previous question so short follow-ups ("and the timeline?") keep their topic
+        previous = [m["content"] for m in chat_history if m["role"] == "user"][-1:]
+        excerpts = retrieve_passages(rec_id, " ".join(previous + [question]), budget)
+        if excerpts:
+            context_heading = ("Meeting Transcript (only the excerpts most relevant to the question, in order; "
+                               "if the answer isn't in them, say it may not have come up in these parts):")
+            context, cacheable = "\n[...]\n".join(excerpts), False
+    app.logger.info(f"Chat: {len(context)} of {len(transcript)} transcript chars"
+                    f"{'' if cacheable else ' (retrieved)'}")
+
+    instructions = f"""You are a senior sales strategist and deal desk analyst embedded in the user's workflow. You've closed 8-figure deals and coached hundreds of AEs. You think in terms of deal mechanics, not just information retrieval.
 
 YOUR ROLE:
 You have access to a meeting transcript and summary. When the user asks a question, don't just search the transcript — interpret it through a sales lens. Connect dots. Spot patterns. Flag risks the rep might miss.
@@ -1085,41 +3662,69 @@ FORMATTING:
 - If something wasn't discussed in the meeting, say so in one sentence — never fabricate or speculate beyond what the transcript supports
 - When quoting the transcript, use exact words in quotation marks
 
-Meeting Transcript:
-{transcript[:MAX_CHARS_PER_CHUNK]}
-
-Meeting Summary:
-{summary or 'Not generated yet.'}"""
+{context_heading}
+{context}"""
+    # The instructions + full transcript prefix is identical on every turn, so it
+    # is marked for prompt caching; the summary may change and goes after it.
+    # Retrieved excerpts differ per question and aren't worth a cache write.
+    system = [
+        {"type": "text", "text": instructions},
+        {"type": "text", "text": f"Meeting Summary:\n{summary or 'Not generated yet.'}"},
+    ]
+    if cacheable:
+        system[0]["cache_control"] = {"type": "ephemeral"}
 
     messages = [{"role": m["role"], "content": m["content"]} for m in chat_history]
     messages.append({"role": "user", "content": question})
 
-    try:
-        client = get_claude()
-        msg = call_claude(lambda: client.messages.create(
-            model="claude-sonnet-4-5-20250929", max_tokens=1024,
-            system=system_prompt, messages=messages,
-        ))
-        return jsonify({"answer": msg.content[0].text})
-    except Exception as e:
-        return handle_api_error(e)
+    def remember(answer):
+        if rec_id:
+            save_chat_turn(rec_id, question, answer)
+
+    return complete_or_stream({"max_tokens": 1024, "system": system, "messages": messages}, "answer",
+                              on_complete=remember)
+
+
+@app.route("/api/recording/<rec_id>/chat", methods=["GET"])
+def get_chat(rec_id):
+    return jsonify(load_chat_history(rec_id))
 
 
 @app.route("/api/stats", methods=["POST"])
 def stats():
-    transcript = request.json.get("transcript", "")
-    char_count = len(transcript)
-    chunks = len(chunk_transcript(transcript))
+    transcript, _ = request_texts()
+    chunks = count_chunks(transcript)
     return jsonify({
-        "chars": char_count,
-        "estimated_tokens": char_count // 4,
+        "chars": len(transcript),
+        "estimated_tokens": estimate_tokens(transcript),
         "chunks": chunks,
         "estimated_seconds": chunks * 10,
     })
 
 
+@app.route("/api/metrics")
+def metrics():
+    with llm_cache_lock:
+        llm_cache = dict(llm_cache_stats, memory_entries=len(llm_cache_memory))
+        usage = dict(claude_usage_stats)
+    with inflight_lock:
+        coalesce = dict(coalesce_stats)
+    with api_clients_lock:
+        http = dict(connection_stats)
+    return jsonify({
+        "llm_cache": llm_cache,
+        "claude_usage": usage,
+        "http": http,
+        "breakers": {"claude": claude_retry.state(), "whisper": whisper_retry.state()},
+        "limiter": {"claude": claude_limiter.state(), "whisper": whisper_limiter.state()},
+        "coalesced": coalesce,
+    })
+
+
 if __name__ == "__main__":
     os.makedirs("uploads", exist_ok=True)
     init_db()
+    # Local dev: run a job worker in-process so no second terminal is needed
+    threading.Thread(target=run_worker, daemon=True).start()
     port = int(os.environ.get("PORT", 5050))
     app.run(debug=False, host="0.0.0.0", port=port)
@@ -2,12 +2,18 @@
 let mr = null, chunks = [], blob = null;
 let transcript = "", summary = "", email = "", chatHist = [];
 let ti = null, sec = 0, sr = null, live = "", interim = "";
+let recT0 = 0;
+let streamSession = null, streamQueue = Promise.resolve(), streamPending = [];
+let streamSent = 0, streamFailed = false;
+const STREAM_PUSH_EVERY = 5;  // MediaRecorder slices (1s each) per segment upload
 let actx = null, anl = null, af = null;
 const tones = ["casual", "professional", "urgent"];
 let toneIdx = 0;
 let dict = null, isDictating = false;
 let activeRecordingId = null;
 let recordings = [];
+let recordingsVersion = null, recordingsCursor = null, recordingsPaging = false;
+let searchResults = null, searchSeq = 0, searchTimer = null;
 let meetingType = "sales";
 let emailType = "customer";
 const defaultPills = ["What are the key next steps?", "Any risks to flag?", "Who owns what?"];
@@ -24,7 +30,7 @@ const retryBtn = $("retryBtn"), copyBtn = $("copyBtn");
 const qeIn = $("qeInput"), qeBtn = $("qeBtn");
 const chatThread = $("chatThread"), chatPills = $("chatPills");
 const chatIn = $("chatIn"), sendBtn = $("sendBtn"), micBtn = $("micBtn"), micDot = $("micDot");
-const sidebar = $("sidebar"), recordingsList = $("recordingsList");
+const sidebar = $("sidebar"), recordingsList = $("recordingsList"), searchIn = $("searchIn");
 const newCallBtn = $("newCallBtn"), sidebarToggle = $("sidebarToggle");
 const sidebarOverlay = $("sidebarOverlay");
 const ctxMenu = $("ctxMenu"), ctxRename = $("ctxRename");
@@ -171,6 +177,154 @@ function updateTranscriptPreview(text) {
 transcriptToggle.onclick = function() { if (!txLocked) toggleTranscript(); };
 transcriptPreview.onclick = function() { if (!txLocked) toggleTranscript(true); };
 
+// ═══ Live transcription ═══
+async function startStream() {
+  streamSession = null;
+  streamQueue = Promise.resolve();
+  streamPending = [];
+  streamSent = 0;
+  streamFailed = false;
+  try {
+    const r = await fetch("/api/stream/start", { method: "POST" });
+    const d = await r.json();
+    if (d.session_id) streamSession = d;
+  } catch (e) {
+    console.error("Live transcription unavailable:", e);
+  }
+}
+
+function pushSegment(data) {
+  if (!streamSession || streamFailed) return;
+  streamPending.push(data);
+  if (streamPending.length >= STREAM_PUSH_EVERY) flushSegments();
+}
+
+function flushSegments() {
+  if (!streamSession || streamFailed || streamPending.length === 0) return streamQueue;
+  const part = new Blob(streamPending, { type: "audio/webm" });
+  const elapsed = ((Date.now() - recT0) / 1000).toFixed(1);
+  streamPending = [];
+  // Segments must arrive in order, so uploads are chained
+  streamQueue = streamQueue.then(async function() {
+    if (streamFailed) return;
+    try {
+      const r = await fetch("/api/stream/" + streamSession.session_id + "/segment?offset=" +
+        streamSent + "&elapsed=" + elapsed, { method: "POST", body: part });
+      if (!r.ok) throw new Error("HTTP " + r.status);
+      streamSent += part.size;
+    } catch (e) {
+      console.error("Segment upload failed:", e);
+      streamFailed = true;
+    }
+  });
+  return streamQueue;
+}
+
+async function finishStream(duration) {
+  await flushSegments();
+  if (!streamSession || streamFailed) return null;
+  try {
+    const r = await fetch("/api/stream/" + streamSession.session_id + "/finish", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ duration: duration })
+    });
+    const d = await r.json();
+    if (d.error) return null;
+    const res = await waitForJob(d.job_id, function(j) {
+      txArea.innerHTML = '<span class="empty">Transcribing with AI... ' + esc(jobLabel(j)) + '</span>';
+    });
+    res.id = d.id;
+    return res;
+  } catch (e) {
+    console.error("Finishing live transcription failed:", e);
+    return null;
+  }
+}
+
+async function transcribeBlob(b, duration) {
+  var fd = new FormData();
+  fd.append("audio", b, "recording.webm");
+  fd.append("duration", duration);
+  console.log("Sending audio to Whisper...", b.size, "bytes");
+  var r = await fetch("/api/transcribe", { method: "POST", body: fd });
+  var d = await r.json();
+  if (d.error) return d;
+  try {
+    var res = await waitForJob(d.job_id, function(j) {
+      txArea.innerHTML = '<span class="empty">Transcribing with AI... ' + esc(jobLabel(j)) + '</span>';
+    });
+    res.id = d.id;
+    return res;
+  } catch (e) {
+    fetch("/api/recording/" + d.id, { method: "DELETE" });
+    return { error: e.message };
+  }
+}
+
+// ═══ Background jobs ═══
+const JOB_POLL_MS = 1000;
+
+async function waitForJob(id, onProgress) {
+  while (true) {
+    const r = await fetch("/api/jobs/" + id);
+    const j = await r.json();
+    if (j.status === "done") return j.result;
+    if (j.status === "failed" || !j.status) throw new Error(j.error || "Job failed");
+    if (onProgress) onProgress(j);
+    await new Promise(function(res) { setTimeout(res, JOB_POLL_MS); });
+  }
+}
+
+function jobLabel(j) {
+  if (!j.stage) return "(queued)";
+  var p = j.progress || {};
+  return "(" + j.stage + (p.total > 1 ? " " + p.current + "/" + p.total : "") + ")";
+}
+
+// Saved recordings are referenced by id and the server loads the transcript
+// and summary itself; only unsaved text is sent in full.
+function textsBody(extra) {
+  var body = activeRecordingId
+    ? { recording_id: activeRecordingId }
+    : { transcript: transcript, summary: summary };
+  return Object.assign(body, extra || {});
+}
+
+// ═══ Streaming responses ═══
+// POSTs JSON and reads the server-sent events back. onText gets the text so far
+// after every delta; resolves with the final "done"/"error" payload.
+async function streamPost(url, body, onText, onProgress) {
+  const r = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body)
+  });
+  if ((r.headers.get("Content-Type") || "").indexOf("text/event-stream") !== 0) return await r.json();
+
+  const reader = r.body.getReader(), dec = new TextDecoder();
+  let buf = "", text = "", result = null;
+  while (true) {
+    const chunk = await reader.read();
+    if (chunk.done) break;
+    buf += dec.decode(chunk.value, { stream: true });
+    let i;
+    while ((i = buf.indexOf("\n\n")) >= 0) {
+      let ev = "message", data = "";
+      buf.slice(0, i).split("\n").forEach(function(line) {
+        if (line.indexOf("event: ") === 0) ev = line.slice(7);
+        else if (line.indexOf("data: ") === 0) data += line.slice(6);
+      });
+      buf = buf.slice(i + 2);
+      const d = data ? JSON.parse(data) : {};
+      if (ev === "delta") { text += d.text; if (onText) onText(text); }
+      else if (ev === "progress") { if (onProgress) onProgress(d); }
+      else if (ev === "done" || ev === "error") result = d;
+    }
+  }
+  return result || { error: "Connection closed before the response finished" };
+}
+
 // ═══ Recording ═══
 recBtn.onclick = async function() {
   if (mr && mr.state === "recording") stopRec();
@@ -191,7 +345,10 @@ async function startRec() {
     live = "";
     interim = "";
     mr.ondataavailable = function(e) {
-      if (e.data.size > 0) chunks.push(e.data);
+      if (e.data.size > 0) {
+        chunks.push(e.data);
+        pushSegment(e.data);
+      }
     };
 
     mr.onstop = async function() {
@@ -211,11 +368,12 @@ async function startRec() {
       recBtn.disabled = true;
 
       try {
-        var fd = new FormData();
-        fd.append("audio", blob, "recording.webm");
-        console.log("Sending audio to Whisper...", blob.size, "bytes");
-        var r = await fetch("/api/transcribe", { method: "POST", body: fd });
-        var d = await r.json();
+        // Most of the audio was already transcribed while recording
+        var d = await finishStream(sec);
+        if (!d) {
+          if (streamSession) fetch("/api/recording/" + streamSession.id, { method: "DELETE" });
+          d = await transcribeBlob(blob, sec);
+        }
         console.log("Whisper response:", d);
 
         if (d.error) {
@@ -235,9 +393,11 @@ async function startRec() {
           chatIn.disabled = false;
           sendBtn.disabled = false;
           chatPills.classList.remove("hidden");
-          saveRecording(transcript, sec);
-          analyzeTranscript(transcript);
+          activeRecordingId = d.id;
+          loadRecordings();
+          runPipeline(d.id);
         } else {
+          fetch("/api/recording/" + d.id, { method: "DELETE" });
           txArea.innerHTML = '<span class="empty">No speech detected</span>';
           transcriptPreview.textContent = "";
           wordCount.textContent = "";
@@ -253,6 +413,8 @@ async function startRec() {
     console.log("mr state:", mr?.state);
     console.log("mr.onstop is set:", typeof mr?.onstop === "function");
 
+    await startStream();
+    recT0 = Date.now();
     mr.start(1000);
     startSR();
     startWave(s);
@@ -300,43 +462,28 @@ function stopRec() {
 
 // ═══ Sidebar: Save / Load / Delete ═══
 
-async function saveRecording(text, duration) {
-  try {
-    const r = await fetch("/api/save_recording", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ transcript: text, duration: duration })
-    });
-    const d = await r.json();
-    if (d.id) {
-      activeRecordingId = d.id;
-      await loadRecordings();
-      generateName(d.id, text);
-    }
-  } catch (e) {
-    console.error("Failed to save recording:", e);
-  }
-}
-
-async function analyzeTranscript(text) {
+async function analyzeTranscript(id) {
   try {
     const r = await fetch("/api/analyze", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ transcript: text })
+      body: JSON.stringify({ recording_id: id })
     });
-    const d = await r.json();
-    meetingType = d.meeting_type || "sales";
-    emailType = d.email_default || "customer";
-    updateEmailTypeChips();
-    renderPills(d.pills || defaultPills);
-    renderAlerts(d.alerts || []);
+    applyAnalysis(await r.json());
   } catch (e) {
     console.error("Failed to analyze:", e);
     renderPills(defaultPills);
   }
 }
 
+function applyAnalysis(d) {
+  meetingType = d.meeting_type || "sales";
+  emailType = d.email_default || "customer";
+  updateEmailTypeChips();
+  renderPills(d.pills || defaultPills);
+  renderAlerts(d.alerts || []);
+}
+
 function renderPills(pills) {
   var html = "";
   pills.forEach(function(q) {
@@ -375,32 +522,99 @@ function updateEmailTypeChips() {
   });
 }
 
-async function generateName(id, text) {
+// Name, analysis and summary are produced by one server-side job; each is
+// shown as soon as it lands in the job's partial result.
+async function runPipeline(id) {
+  const shown = {};
+  function apply(res) {
+    if (!res || id !== activeRecordingId) return;
+    if (res.name && !shown.name) { shown.name = true; loadRecordings(); }
+    if (res.analysis && !shown.analysis) { shown.analysis = true; applyAnalysis(res.analysis); }
+    if (res.summary && !shown.summary) {
+      shown.summary = true;
+      summary = res.summary;
+      sumArea.innerHTML = md(summary);
+      emBtn.disabled = false;
+    }
+  }
+
+  skel(sumArea);
   try {
-    const r = await fetch("/api/generate_name", {
+    const r = await fetch("/api/pipeline", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ id: id, transcript: text })
+      body: JSON.stringify({ recording_id: id })
     });
     const d = await r.json();
-    if (d.name) {
-      loadRecordings();
-    }
+    if (d.error) throw new Error(d.error);
+    const res = await waitForJob(d.job_id, function(j) { apply(j.result); });
+    apply(res);
+    if (res.errors && res.errors.summary && id === activeRecordingId) showErr(sumArea, res.errors.summary);
+    if (res.errors && res.errors.analysis && id === activeRecordingId) renderPills(defaultPills);
   } catch (e) {
-    console.error("Failed to generate name:", e);
+    console.error("Pipeline failed:", e);
+    if (id === activeRecordingId && !shown.summary) showErr(sumArea, e.message);
+    if (id === activeRecordingId && !shown.analysis) renderPills(defaultPills);
   }
 }
 
+// The sidebar loads the first page, then asks only for changes since the
+// list version it has; older pages are fetched as the list is scrolled.
 async function loadRecordings() {
   try {
-    const r = await fetch("/api/recordings");
-    recordings = await r.json();
-    renderRecordingsList();
+    if (recordingsVersion === null) {
+      const r = await fetch("/api/recordings");
+      const d = await r.json();
+      recordings = d.recordings;
+      recordingsCursor = d.next_cursor;
+      recordingsVersion = d.version;
+    } else {
+      const r = await fetch("/api/recordings?since=" + recordingsVersion);
+      const d = await r.json();
+      if (d.version === recordingsVersion) return;
+      const gone = new Set(d.deleted.concat(d.changed.map(function(rec) { return rec.id; })));
+      recordings = recordings.filter(function(rec) { return !gone.has(rec.id); }).concat(d.changed);
+      recordings.sort(function(a, b) {
+        return a.created_at < b.created_at ? 1 : a.created_at > b.created_at ? -1 : (a.id < b.id ? 1 : -1);
+      });
+      recordingsVersion = d.version;
+    }
+    if (searchResults) runSearch();
+    else renderRecordingsList();
+    fillRecordingsList();
   } catch (e) {
     console.error("Failed to load recordings:", e);
   }
 }
 
+async function loadMoreRecordings() {
+  if (!recordingsCursor || recordingsPaging) return;
+  recordingsPaging = true;
+  try {
+    const r = await fetch("/api/recordings?cursor=" + encodeURIComponent(recordingsCursor));
+    const d = await r.json();
+    const have = new Set(recordings.map(function(rec) { return rec.id; }));
+    recordings = recordings.concat(d.recordings.filter(function(rec) { return !have.has(rec.id); }));
+    recordingsCursor = d.next_cursor;
+    renderRecordingsList();
+  } catch (e) {
+    console.error("Failed to load more recordings:", e);
+  } finally {
+    recordingsPaging = false;
+  }
+  fillRecordingsList();
+}
+
+// Keep paging while the list is too short to scroll
+function fillRecordingsList() {
+  if (recordingsCursor && !searchResults && recordingsList.scrollHeight <= recordingsList.clientHeight) loadMoreRecordings();
+}
+
+recordingsList.addEventListener("scroll", function() {
+  if (searchResults) return;
+  if (recordingsList.scrollTop + recordingsList.clientHeight >= recordingsList.scrollHeight - 200) loadMoreRecordings();
+});
+
 function groupByDate(recs) {
   const groups = {};
   const now = new Date();
@@ -425,7 +639,67 @@ function groupByDate(recs) {
   return groups;
 }
 
+function recordingItemHtml(rec, snippet) {
+  const isActive = rec.id === activeRecordingId;
+  const dur = rec.duration ? fmt(rec.duration) : "";
+  return '<div class="recording-item' + (isActive ? ' active' : '') + '" data-id="' + esc(rec.id) + '">' +
+    '<div class="recording-item-info">' +
+    '<div class="recording-item-name">' + esc(rec.name) + '</div>' +
+    '<div class="recording-item-meta">' + dur + '</div>' +
+    (snippet ? '<div class="recording-item-snippet">' + snippet + '</div>' : '') +
+    '</div>' +
+    '<button class="recording-delete" data-id="' + esc(rec.id) + '" title="Delete">' +
+    '<svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round">' +
+    '<polyline points="3 6 5 6 21 6"/><path d="M19 6l-1 14a2 2 0 0 1-2 2H8a2 2 0 0 1-2-2L5 6"/>' +
+    '<path d="M10 11v6"/><path d="M14 11v6"/><path d="M9 6V4a1 1 0 0 1 1-1h4a1 1 0 0 1 1 1v2"/>' +
+    '</svg></button></div>';
+}
+
+// Search hits are marked with \x02/\x03 by the server; escape, then highlight
+function snippetHtml(s) {
+  return esc(s || "").replace(/\u0002/g, "<mark>").replace(/\u0003/g, "</mark>");
+}
+
+function renderSearchResults() {
+  if (searchResults.length === 0) {
+    recordingsList.innerHTML = '<div class="recordings-empty">No matching recordings.</div>';
+    return;
+  }
+  recordingsList.innerHTML = searchResults.map(function(rec) {
+    return recordingItemHtml(rec, snippetHtml(rec.snippet));
+  }).join("");
+  bindRecordingItems();
+}
+
+async function runSearch() {
+  const q = searchIn.value.trim();
+  const seq = ++searchSeq;
+  if (!q) {
+    searchResults = null;
+    renderRecordingsList();
+    return;
+  }
+  try {
+    const r = await fetch("/api/search?q=" + encodeURIComponent(q));
+    const d = await r.json();
+    if (seq !== searchSeq) return;  // a newer query is already on its way
+    searchResults = d.results;
+    renderSearchResults();
+  } catch (e) {
+    console.error("Search failed:", e);
+  }
+}
+
+searchIn.addEventListener("input", function() {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(runSearch, 150);
+});
+
 function renderRecordingsList() {
+  if (searchResults) {
+    renderSearchResults();
+    return;
+  }
   if (recordings.length === 0) {
     recordingsList.innerHTML = '<div class="recordings-empty">No recordings yet.<br>Hit the red button to start.</div>';
     return;
@@ -441,23 +715,15 @@ function renderRecordingsList() {
 
     html += '<div class="sidebar-group-label">' + esc(label) + '</div>';
     recs.forEach(function(rec) {
-      const isActive = rec.id === activeRecordingId;
-      const dur = rec.duration ? fmt(rec.duration) : "";
-      html += '<div class="recording-item' + (isActive ? ' active' : '') + '" data-id="' + esc(rec.id) + '">' +
-        '<div class="recording-item-info">' +
-        '<div class="recording-item-name">' + esc(rec.name) + '</div>' +
-        '<div class="recording-item-meta">' + dur + '</div>' +
-        '</div>' +
-        '<button class="recording-delete" data-id="' + esc(rec.id) + '" title="Delete">' +
-        '<svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round">' +
-        '<polyline points="3 6 5 6 21 6"/><path d="M19 6l-1 14a2 2 0 0 1-2 2H8a2 2 0 0 1-2-2L5 6"/>' +
-        '<path d="M10 11v6"/><path d="M14 11v6"/><path d="M9 6V4a1 1 0 0 1 1-1h4a1 1 0 0 1 1 1v2"/>' +
-        '</svg></button></div>';
+      html += recordingItemHtml(rec);
     });
   });
 
   recordingsList.innerHTML = html;
+  bindRecordingItems();
+}
 
+function bindRecordingItems() {
   // Attach click handlers
   recordingsList.querySelectorAll(".recording-item").forEach(function(el) {
     el.addEventListener("click", function(e) {
@@ -526,16 +792,18 @@ async function loadRecording(id) {
       emTools.classList.add("hidden");
     }
 
-    // Reset chat
+    // Reset chat, then replay the saved conversation
     chatThread.innerHTML = '<div class="brow brow-ai"><div class="bub bub-ai">Record a meeting, then ask me anything about it.</div></div>';
+    loadChat(id);
 
     // Reset player
     player.classList.add("hidden");
     player.src = "";
     blob = null;
 
-    // Analyze for smart features
-    if (transcript) analyzeTranscript(transcript);
+    // Smart features: stored analysis if it is current, otherwise compute it once
+    if (d.analysis) applyAnalysis(d.analysis);
+    else if (transcript) analyzeTranscript(id);
 
     // Update sidebar active state
     renderRecordingsList();
@@ -695,12 +963,13 @@ sumBtn.onclick = async function() {
   const t0 = Date.now();
 
   try {
-    const r = await fetch("/api/summarize", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ transcript: transcript })
-    });
-    const d = await r.json();
+    const d = await streamPost("/api/summarize/stream",
+      textsBody(),
+      function(text) { sumArea.innerHTML = md(text); },
+      function(p) {
+        skel(sumArea);
+        sumArea.innerHTML += '<div class="meta">' + esc(jobLabel({ stage: p.stage, progress: p })) + '</div>';
+      });
     const elapsed = ((Date.now() - t0) / 1000).toFixed(1);
 
     if (d.error) {
@@ -737,12 +1006,7 @@ emBtn.onclick = async function() {
   skel(emArea);
 
   try {
-    const r = await fetch("/api/email", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ transcript: transcript, summary: summary, email_type: emailType })
-    });
-    const d = await r.json();
+    const d = await streamPost("/api/email/stream", textsBody({ email_type: emailType }), showEmailText);
 
     if (d.error) {
       showErr(emArea, d.error);
@@ -759,23 +1023,16 @@ emBtn.onclick = async function() {
   emBtn.disabled = false;
 };
 
+function showEmailText(text) { emArea.textContent = text; }
+
 // ── Email regeneration ──
 async function regenEmail(style, btn) {
   btn.classList.add("loading");
   emArea.innerHTML = '<div class="skeleton" style="width:90%"></div><div class="skeleton"></div>';
 
   try {
-    const r = await fetch("/api/email/regenerate", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        transcript: transcript,
-        summary: summary,
-        current_email: email,
-        style: style
-      })
-    });
-    const d = await r.json();
+    const d = await streamPost("/api/email/regenerate/stream",
+      textsBody({ current_email: email, style: style }), showEmailText);
 
     if (d.error) showErr(emArea, d.error);
     else { email = d.email; emArea.textContent = email; }
@@ -796,12 +1053,7 @@ salesFollowUpBtn.onclick = async function() {
   salesFollowUpBtn.classList.add("loading");
   emArea.innerHTML = '<div class="skeleton" style="width:90%"></div><div class="skeleton"></div>';
   try {
-    var r = await fetch("/api/email", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ transcript: transcript, summary: summary, email_type: "sales_followup" })
-    });
-    var d = await r.json();
+    var d = await streamPost("/api/email/stream", textsBody({ email_type: "sales_followup" }), showEmailText);
     if (d.error) showErr(emArea, d.error);
     else { email = d.email; emArea.textContent = email; emTools.classList.remove("hidden"); }
   } catch (e) { showErr(emArea, e.message); }
@@ -835,12 +1087,8 @@ async function doQE() {
   emArea.innerHTML = '<div class="skeleton" style="width:88%"></div><div class="skeleton"></div>';
 
   try {
-    const r = await fetch("/api/email/quick-edit", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ current_email: email, instruction: ins })
-    });
-    const d = await r.json();
+    const d = await streamPost("/api/email/quick-edit/stream",
+      { current_email: email, instruction: ins, recording_id: activeRecordingId }, showEmailText);
 
     if (d.error) showErr(emArea, d.error);
     else { email = d.email; emArea.textContent = email; qeIn.value = ""; }
@@ -900,25 +1148,23 @@ async function sendChat() {
   chatIn.value = "";
   sendBtn.disabled = true;
   const tid = addDots();
+  let row = null;
 
   try {
-    const r = await fetch("/api/chat", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        question: q,
-        transcript: transcript,
-        history: chatHist,
-        summary: summary
-      })
+    // Saved recordings keep their conversation on the server
+    const body = textsBody({ question: q });
+    if (!activeRecordingId) body.history = chatHist;
+    const d = await streamPost("/api/chat/stream", body, function(text) {
+      if (!row) { rmDots(tid); row = addBub("ai", text); }
+      else row.querySelector(".bub").innerHTML = fmtAi(text);
     });
-    const d = await r.json();
     rmDots(tid);
 
     if (d.error) {
+      if (row) row.remove();
       addBub("err", d.error);
     } else {
-      addBub("ai", d.answer);
+      if (!row) addBub("ai", d.answer);
       chatHist.push({ role: "user", content: q }, { role: "assistant", content: d.answer });
     }
   } catch (e) {
@@ -930,6 +1176,17 @@ async function sendChat() {
   chatIn.focus();
 }
 
+async function loadChat(id) {
+  try {
+    const r = await fetch("/api/recording/" + id + "/chat");
+    const msgs = await r.json();
+    if (id !== activeRecordingId) return;
+    msgs.forEach(function(m) { addBub(m.role === "user" ? "user" : "ai", m.content); });
+  } catch (e) {
+    console.error("Failed to load chat:", e);
+  }
+}
+
 // ── Chat bubbles ──
 function addBub(type, text) {
   const row = document.createElement("div");
@@ -939,10 +1196,7 @@ function addBub(type, text) {
     row.innerHTML = '<div class="bub bub-user">' + esc(text) + '</div>';
   } else if (type === "ai") {
     row.className = "brow brow-ai";
-    const formatted = esc(text)
-      .replace(/\*\*(.+?)\*\*/g, "<strong>$1</strong>")
-      .replace(/\n/g, "<br>");
-    row.innerHTML = '<div class="bub bub-ai">' + formatted + '</div>';
+    row.innerHTML = '<div class="bub bub-ai">' + fmtAi(text) + '</div>';
   } else {
     row.className = "brow brow-ai";
     row.innerHTML = '<div class="bub bub-err">' + esc(text) + '</div>';
@@ -950,6 +1204,13 @@ function addBub(type, text) {
 
   chatThread.appendChild(row);
   row.scrollIntoView({ behavior: "smooth", block: "nearest" });
+  return row;
+}
+
+function fmtAi(text) {
+  return esc(text)
+    .replace(/\*\*(.+?)\*\*/g, "<strong>$1</strong>")
+    .replace(/\n/g, "<br>");
 }
 
 let dc = 0;
@@ -0,0 +1,89 @@
+"""Concurrent generation requests must only ever write to their own recording."""
+import importlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace as NS
+
+import pytest
+
+RECORDINGS = 10
+TAG = re.compile(r"REC-\d+")
+
+
+class FakeMessages:
+    """Answers with text naming the recording whose transcript is in the prompt."""
+
+    def create(self, model, stream=False, messages=(), **kwargs):
+        prompt = " ".join(m["content"] if isinstance(m["content"], str) else str(m["content"]) for m in messages)
+        tag = TAG.search(prompt).group(0)
+        time.sleep(random.uniform(0, 0.05))
+        text = f"Generated for {tag} only."
+        usage = NS(input_tokens=10, output_tokens=5, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+        if not stream:
+            return NS(content=[NS(type="text", text=text)], usage=usage, stop_reason="end_turn")
+        return self._stream(text, usage)
+
+    def _stream(self, text, usage):
+        yield NS(type="message_start", message=NS(usage=usage))
+        for word in text.split(" "):
+            time.sleep(random.uniform(0, 0.01))
+            yield NS(type="content_block_delta", delta=NS(type="text_delta", text=word + " "))
+        yield NS(type="message_delta", usage=NS(output_tokens=5))
+
+
+@pytest.fixture()
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("app")
+    monkeypatch.setattr(module, "DATABASE", str(tmp_path / "recordings.db"))
+    module._reset_db_connections()
+    module.init_db()
+    client = NS(messages=FakeMessages())
+    monkeypatch.setattr(module, "get_claude", lambda: client)
+    # Keep the concurrency cap but not the requests-per-minute pacing
+    monkeypatch.setattr(module.claude_limiter, "rate", 1000.0)
+    return module
+
+
+def test_concurrent_generation_writes_only_own_recording(app_module):
+    setup = app_module.app.test_client()
+    ids = {}
+    for i in range(RECORDINGS):
+        rec = setup.post("/api/save_recording", json={
+            "transcript": f"Speaker 1: This is meeting REC-{i}. We agreed on next steps for REC-{i}.",
+            "duration": 60,
+        }).get_json()
+        ids[f"REC-{i}"] = rec["id"]
+
+    calls = []
+    for tag, rec_id in ids.items():
+        calls.append(("/api/summarize/stream", {"recording_id": rec_id}))
+        calls.append(("/api/email", {"recording_id": rec_id, "email_type": "customer"}))
+        calls.append(("/api/email/stream", {"recording_id": rec_id, "email_type": "customer"}))
+    random.shuffle(calls)
+
+    errors = []
+    start = threading.Barrier(len(calls))
+
+    def fire(url, body):
+        client = app_module.app.test_client()
+        start.wait()
+        resp = client.post(url, json=body)
+        data = resp.get_data(as_text=True)  # runs the stream to completion
+        if resp.status_code != 200 or "event: error" in data:
+            errors.append((url, resp.status_code, data[:200]))
+
+    threads = [threading.Thread(target=fire, args=call) for call in calls]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+    reader = app_module.app.test_client()
+    for tag, rec_id in ids.items():
+        rec = reader.get(f"/api/recording/{rec_id}").get_json()
+        for field in ("summary", "email"):
+            assert set(TAG.findall(rec[field])) == {tag}, (field, tag, rec[field])
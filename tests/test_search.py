@@ -0,0 +1,23 @@
+"""/api/search keeps its result limit within bounds."""
+import importlib
+
+import pytest
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("app")
+    monkeypatch.setattr(module, "DATABASE", str(tmp_path / "recordings.db"))
+    module._reset_db_connections()
+    module.init_db()
+    client = module.app.test_client()
+    for i in range(105):
+        client.post("/api/save_recording", json={"transcript": f"Budget review number {i}.", "duration": 60})
+    return client
+
+
+@pytest.mark.parametrize("limit, expected", [(-1, 1), (0, 1), (3, 3), (500, 100)])
+def test_search_limit_is_clamped(client, limit, expected):
+    results = client.get(f"/api/search?q=budget&limit={limit}").get_json()["results"]
+    assert len(results) == expected